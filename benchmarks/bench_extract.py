@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_matches
+import source.extractor as extractor
+
+
+def load_revision(revision: str):
+    # import source/matches.py as it was at an older commit
+    code = subprocess.run(["git", "show", f"{revision}:source/matches.py"],
+                          capture_output=True, text=True, check=True).stdout
+    file = tempfile.NamedTemporaryFile("w", suffix=".py", delete=False)
+    file.write(code)
+    file.close()
+
+    spec = importlib.util.spec_from_file_location("legacy_matches", file.name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def measure(name: str, func) -> dict:
+    # time and memory are taken on separate runs, tracing slows python down
+    began = time.process_time()
+    func()
+    cpu = time.process_time() - began
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"{name}: {cpu:.2f}s cpu, {peak / 1024 ** 2:.1f}MB peak")
+    return {"cpu": cpu, "peak": peak}
+
+
+def run(n_matches=10000, baseline=None) -> dict:
+    raw_matches = make_matches(n_matches)
+    path = tempfile.mkdtemp()
+
+    results = {}
+    single = results["single_pass"] = measure(
+        "single pass", lambda: extractor.extract(raw_matches).save(path, 0, n_matches))
+
+    if baseline is not None:
+        legacy = load_revision(baseline)
+
+        def four_passes():
+            legacy.extract_match_info(raw_matches, path, 0, n_matches)
+            legacy.extract_champions_data(
+                raw_matches, {}, path, 0, n_matches)
+            legacy.extract_players_info(
+                raw_matches, {}, path, 0, n_matches)
+            legacy.extract_players_stats(
+                raw_matches, {}, path, 0, n_matches)
+
+        four = results["four_passes"] = measure(
+            f"four passes ({baseline})", four_passes)
+        print(f"speedup: {four['cpu'] / single['cpu']:.1f}x cpu, "
+              f"{four['peak'] / single['peak']:.1f}x peak memory")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument("--baseline", default=None,
+                        help="git revision holding the four pass extractors")
+    args = parser.parse_args()
+
+    run(args.matches, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_matches
+import source.ingest as ingest
+
+
+def pad(match: dict, rng: random.Random) -> dict:
+    # the synthetic matches only carry what the extractor reads, a real
+    # match-v4 body has ~110 stats and the deltas of every 10 minutes
+    for participant in match["participants"]:
+        for i in range(90):
+            participant["stats"][f"unusedStat{i}"] = rng.randint(0, 50000)
+        for field, deltas in list(participant["timeline"].items()):
+            if isinstance(deltas, dict):
+                deltas.update({"10-20": rng.random() * 500,
+                               "20-30": rng.random() * 500,
+                               "30-end": rng.random() * 500})
+        for field in ["csDiffPerMinDeltas", "xpDiffPerMinDeltas", "damageTakenDiffPerMinDeltas"]:
+            participant["timeline"][field] = {"0-10": rng.random(), "10-20": rng.random()}
+        participant["runes"] = [{"runeId": rng.randint(8000, 9000), "rank": 1} for _ in range(6)]
+    for identity in match["participantIdentities"]:
+        identity["player"]["matchHistoryUri"] = f"/v1/stats/player_history/EUW1/{rng.randint(1, 10 ** 9)}"
+    return match
+
+
+def measure(name: str, payloads: list, decode) -> dict:
+    # cpu per body, then the memory held by the decoded matches
+    began = time.process_time()
+    for payload in payloads:
+        decode(payload)
+    cpu = time.process_time() - began
+
+    tracemalloc.start()
+    kept = [decode(payload) for payload in payloads]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    print(f"{name}: {cpu / len(payloads) * 1e6:.0f}us per match, "
+          f"{held / 1024 ** 2:.1f}MB held for {len(payloads)} matches")
+    return {"cpu": cpu, "held": held}
+
+
+def run(n_matches=2000) -> dict:
+    rng = random.Random(7)
+    payloads = [json.dumps(pad(match, rng)).encode()
+                for match in make_matches(n_matches)]
+    print(f"average body: {sum(map(len, payloads)) / len(payloads) / 1024:.1f}kB")
+
+    full = measure("json full payload", payloads, json.loads)
+    projected = measure(f"{ingest.loads.__module__} decode + projection",
+                        payloads, ingest.decode_match)
+    print(f"speedup: {full['cpu'] / projected['cpu']:.1f}x cpu, "
+          f"{full['held'] / projected['held']:.1f}x less memory held")
+
+    return {"json": full, "projected": projected}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=2000)
+    args = parser.parse_args()
+
+    run(args.matches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import World
+from benchmarks.standin import StandIn
+from source.journal import Journal
+from source.dedup import GameIndex
+import source.client as client
+import source.players as players
+import source.matches as matches
+import source.merge as merge
+import source.crawler as crawler
+import source.jobs as jobs
+import source.settings as settings
+
+import pandas as pd
+
+
+def throttled() -> float:
+    # seconds every limiter made the workers wait
+    return sum(limiter.throttled for limiter in client._limiters.values())
+
+
+def stage(name: str, items: int, func) -> dict:
+    began = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - began
+    print(f"{name}: {elapsed:.1f}s, {items / elapsed:.1f} items/s")
+    return {"seconds": elapsed, "items": items, "rate": items / elapsed}
+
+
+def run(players_per_region=100, games_per_player=20, regions=("euw1",), app_limits="100:1,1000:120", latency=0.02, error_rate=0.0, workers=8) -> dict:
+    # get_entries -> get_matches one step at a time on the first region,
+    # then the threaded crawl over every region
+    worlds = {region: World(players_per_region, games_per_player, region.upper(), seed=i)
+              for i, region in enumerate(regions)}
+    standin = StandIn(worlds, app_limits=app_limits, latency=latency,
+                      error_rate=error_rate).start()
+    client.API_URL = standin.api_url
+    client._limiters.clear()
+    results = {}
+
+    try:
+        region = regions[0]
+        path = tempfile.mkdtemp()
+        n_players = players_per_region
+        n_games = len(worlds[region].games)
+
+        results["get_entries"] = stage("get_entries", n_players, lambda: players.get_entries(
+            path, "token", region=region))
+        summoners = pd.read_pickle(f"{path}/players_pool.pkl")["summonerId"].to_list()
+
+        results["get_account_info"] = stage("get_account_info", n_players, lambda: players.get_account_info(
+            summoners, "token", path, 0, len(summoners),
+            journal=Journal(f"{path}/journal.sqlite", "account_info"), region=region))
+        accounts = pd.read_pickle(f"{path}/account_info.pkl")["accountId"].to_list()
+
+        results["get_match_history"] = stage("get_match_history", n_players, lambda: players.get_match_history(
+            accounts, "token", path, 0, len(accounts), begin_time=0,
+            journal=Journal(f"{path}/journal.sqlite", "match_history"), region=region))
+        game_ids = pd.read_pickle(f"{path}/match_ids.pkl")["gameId"].to_list()
+
+        results["get_matches"] = stage("get_matches", n_games, lambda: matches.get_matches(
+            game_ids, path, "token", 0, len(game_ids), stream=True, chunk_size=500, region=region))
+
+        # the matches stage of a job run twice into the same folder, the
+        # second run with new games must save them next to the first ones
+        path = tempfile.mkdtemp()
+        settings.INDEX_PATH = f"{path}/index.npz"
+        settings.CACHE_PATH = f"{path}/cache"
+        settings.DIMENSIONS_PATH = f"{path}/dimensions.sqlite"
+        spec = jobs.load_spec(path=path, region=region, stages=["matches"], chunk_size=500)
+        halves = [game_ids[:len(game_ids) // 2], game_ids[len(game_ids) // 2:]]
+
+        def rerun():
+            for ids in halves:
+                pd.DataFrame({"gameId": ids}).to_pickle(f"{path}/match_ids.pkl", protocol=4)
+                jobs.run(spec, jobs.__file__)
+
+        results["job_rerun"] = stage("job rerun", n_games, rerun)
+        saved = merge.merge_files(f"{path}/matches", tempfile.mkdtemp())["match_info"]
+        if saved["match_id"].nunique() != len(game_ids):
+            raise RuntimeError(f"Job rerun saved {saved['match_id'].nunique()} "
+                               f"of {len(game_ids)} games")
+
+        # every region at once, each with its own budget
+        path = tempfile.mkdtemp()
+        results["crawl"] = stage(f"crawl ({len(regions)} regions)", n_games * len(regions),
+                                 lambda: crawler.crawl_regions(
+                                     path, "token", list(regions), begin_time=0, workers=workers,
+                                     chunk_size=500, index=GameIndex(f"{path}/index.npz")))
+    finally:
+        standin.stop()
+
+    results["requests"] = standin.requests
+    results["throttled_responses"] = standin.throttled
+    results["throttled_seconds"] = throttled()
+    print(f"requests: {standin.requests}, 429s: {standin.throttled}, "
+          f"waited for the limiter: {results['throttled_seconds']:.1f}s")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--games", type=int, default=20, help="games per player")
+    parser.add_argument("--regions", default="euw1")
+    parser.add_argument("--app-limits", default="100:1,1000:120")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    run(args.players, args.games, tuple(args.regions.split(",")), args.app_limits,
+        args.latency, args.error_rate, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_matches
+from benchmarks.bench_extract import measure
+from source.aggregates import AggregateStore
+from source.similarity import ScoreIndex
+import source.extractor as extractor
+import source.merge as merge
+import source.matchups as matchups
+import source.meta as meta
+import source.training as training
+
+
+def measure_pool(name: str, func) -> dict:
+    # work done on a process pool, the cpu of the parent is next to
+    # nothing so the wall time and the cpu of the finished workers are taken
+    began = time.perf_counter()
+    began_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    func()
+    wall = time.perf_counter() - began
+    ended_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (ended_cpu.ru_utime - began_cpu.ru_utime) + (ended_cpu.ru_stime - began_cpu.ru_stime)
+
+    print(f"{name}: {wall:.2f}s wall, {cpu:.2f}s workers cpu")
+    return {"wall": wall, "workers_cpu": cpu}
+
+
+def run(n_matches=20000, chunk_size=1000, n_accounts=2000) -> dict:
+    # the stages after the download, on chunks extracted up front
+    path = tempfile.mkdtemp()
+    output_path = tempfile.mkdtemp()
+    raw_matches = make_matches(n_matches, n_accounts=n_accounts)
+    for start in range(0, n_matches, chunk_size):
+        extractor.extract(raw_matches[start:start + chunk_size]).save(
+            path, start, min(start + chunk_size, n_matches))
+    del raw_matches
+
+    results = {}
+    merged = {}
+
+    def merge_files():
+        merged.update(merge.merge_files(path, output_path))
+
+    results["merge_files"] = measure("merge_files", merge_files)
+    results["merge_stats"] = measure(
+        "merge_stats", lambda: merge.merge_stats(merged, output_path))
+    results["merge_matchups"] = measure(
+        "merge matchups", lambda: matchups.merge_files(path, output_path))
+    results["merge_meta"] = measure(
+        "merge meta cube", lambda: meta.merge_files(path, output_path))
+
+    def aggregates():
+        store = AggregateStore(f"{tempfile.mkdtemp()}/aggregates.npz", min_games=2)
+        store.update_from_chunks(path)
+        return store
+
+    results["aggregates"] = measure("aggregates update", aggregates)
+    store = aggregates()
+    results["score_index"] = measure(
+        "score index build", lambda: ScoreIndex.build(store))
+
+    features_path = tempfile.mkdtemp()
+    stats = merge.merge_stats(merged, output_path)
+    results["training_features"] = measure("training features", lambda: training.build_features(
+        stats, merged["match_info"], features_path))
+
+    # model fits need scikit-learn, the rest of the suite doesn't
+    try:
+        import sklearn
+    except ImportError:
+        return results
+
+    jobs = training.grid(["linear_logistic", "decision_tree"], periods=["complete", "last_patch"])
+    results["training"] = measure_pool(
+        "training jobs", lambda: training.evaluate(features_path, jobs))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    run(args.matches, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
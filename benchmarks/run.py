@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmarks.bench_extract as bench_extract
+import benchmarks.bench_ingest as bench_ingest
+import benchmarks.bench_stages as bench_stages
+import benchmarks.bench_pipeline as bench_pipeline
+
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+SUITES = {
+    "extract": lambda scale: bench_extract.run(10000 * scale),
+    "ingest": lambda scale: bench_ingest.run(2000 * scale),
+    "stages": lambda scale: bench_stages.run(20000 * scale),
+    "pipeline": lambda scale: bench_pipeline.run(100 * scale, regions=("euw1", "kr")),
+}
+
+
+def git(*args) -> str:
+    return subprocess.run(["git", *args], capture_output=True, text=True).stdout.strip()
+
+
+def flatten(results: dict, prefix="") -> dict:
+    # {"stages": {"merge_files": {"cpu": 1}}} -> {"stages.merge_files.cpu": 1}
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def save(results: dict, scale: int) -> str:
+    # one file per commit, a dirty tree gets its own file
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = git("status", "--porcelain", "--untracked-files=no") != ""
+    name = f"{commit}-dirty" if dirty else commit
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    file = f"{RESULTS_PATH}/{name}.json"
+    with open(file, "w") as f:
+        json.dump({
+            "commit": commit,
+            "subject": git("log", "-1", "--format=%s"),
+            "dirty": dirty,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "results": results,
+        }, f, indent=2)
+
+    print(f"Results saved at {file}")
+    return file
+
+
+def compare(old: str, new: str):
+    # metrics of two result files side by side, lower is better for all
+    # of them except rates
+    with open(f"{RESULTS_PATH}/{old}.json") as f:
+        before = flatten(json.load(f)["results"])
+    with open(f"{RESULTS_PATH}/{new}.json") as f:
+        after = flatten(json.load(f)["results"])
+
+    print(f"{'metric':<48}{old:>14}{new:>14}{'change':>10}")
+    for key in sorted(set(before) & set(after)):
+        if before[key]:
+            change = f"{(after[key] - before[key]) / before[key] * 100:+.0f}%"
+        else:
+            change = ""
+        print(f"{key:<48}{before[key]:>14.4g}{after[key]:>14.4g}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("suites", nargs="*", default=list(SUITES),
+                        help=f"any of {', '.join(SUITES)}")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="multiplies the size of every benchmark")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two saved results e.g. 41017cf 6699f95")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    results = {}
+    for suite in args.suites:
+        print(f"\n{suite}")
+        results[suite] = SUITES[suite](args.scale)
+    save(results, args.scale)
+
+
+if __name__ == "__main__":
+    main()
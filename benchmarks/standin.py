@@ -0,0 +1,180 @@
+import json
+import math
+import time
+import random
+import threading
+
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# riot's method limits of a development key, per endpoint
+METHOD_LIMITS = {
+    "lol/league/v4/challengerleagues": "30:10,500:600",
+    "lol/league/v4/grandmasterleagues": "30:10,500:600",
+    "lol/league/v4/masterleagues": "30:10,500:600",
+    "lol/league/v4/entries": "50:10",
+    "lol/summoner/v4/summoners": "1600:60",
+    "lol/match/v4/matchlists": "1000:10",
+    "lol/match/v4/matches": "500:10",
+}
+
+
+class Window:
+    # requests counted by a sliding window limit e.g. 20:1
+
+    def __init__(self, limits: str):
+        self.limits = [tuple(int(x) for x in pair.split(":")) for pair in limits.split(",")]
+        self.stamps = deque()
+
+    def hit(self, now: float):
+        # count the request, returns the counts header and the wait if over the limit
+        longest = max(window for _, window in self.limits)
+        while len(self.stamps) > 0 and self.stamps[0] <= now - longest:
+            self.stamps.popleft()
+        self.stamps.append(now)
+
+        counts = []
+        wait = 0
+        for limit, window in self.limits:
+            inside = [x for x in self.stamps if x > now - window]
+            counts.append(f"{len(inside)}:{window}")
+            if len(inside) > limit:
+                wait = max(wait, inside[len(inside) - limit - 1] + window - now)
+
+        return ",".join(counts), wait
+
+
+class StandIn:
+    # a local Riot API serving one synthetic World per region, with the
+    # rate limit headers, 429s, latency and server errors of the real one,
+    # e.g. client.API_URL = StandIn({"euw1": World()}).start().api_url
+
+    def __init__(self, worlds: dict, app_limits="20:1,100:120", method_limits=METHOD_LIMITS, latency=0.02, error_rate=0.0, seed=0):
+        self.worlds = worlds
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.server = None
+
+    def _window(self, key: tuple, limits: str) -> Window:
+        if key not in self.windows:
+            self.windows[key] = Window(limits)
+        return self.windows[key]
+
+    def _route(self, world, method: str, parts: list, query: dict):
+        # status and body of a request
+        if method.startswith("lol/league/v4/") and method.endswith("leagues"):
+            tier = method.split("/")[-1][:-len("leagues")].upper()
+            return 200, world.league(tier)
+
+        if method == "lol/league/v4/entries":
+            tier, division = parts[-2], parts[-1]
+            return 200, world.entries(tier, division, int(query.get("page", ["1"])[0]))
+
+        if method == "lol/summoner/v4/summoners":
+            summoner = world.summoner(parts[-1])
+            return (200, summoner) if summoner else (404, None)
+
+        if method == "lol/match/v4/matchlists":
+            page = world.matchlist(parts[-1], int(query.get("beginTime", ["0"])[0]),
+                                   int(query.get("beginIndex", ["0"])[0]))
+            # like match-v4, past the last game there is nothing to find
+            return (200, page) if len(page["matches"]) > 0 else (404, None)
+
+        if method == "lol/match/v4/matches":
+            match = world.match(int(parts[-1]))
+            return (200, match) if match else (404, None)
+
+        return 404, None
+
+    def handle(self, path: str):
+        # (status, headers, body) for a GET of path
+        url = urlsplit(path)
+        parts = url.path.strip("/").split("/")
+        region, parts = parts[0], parts[1:]
+        method = "/".join(parts[:4])
+        now = time.time()
+
+        with self.lock:
+            self.requests += 1
+            app_counts, app_wait = self._window(
+                (region,), self.app_limits).hit(now)
+            method_limits = self.method_limits.get(method, "1000:10")
+            method_counts, method_wait = self._window(
+                (region, method), method_limits).hit(now)
+            error = self.rng.random() < self.error_rate
+
+        headers = {
+            "X-App-Rate-Limit": self.app_limits,
+            "X-App-Rate-Limit-Count": app_counts,
+            "X-Method-Rate-Limit": method_limits,
+            "X-Method-Rate-Limit-Count": method_counts,
+        }
+
+        if app_wait > 0 or method_wait > 0:
+            with self.lock:
+                self.throttled += 1
+            headers["Retry-After"] = str(math.ceil(max(app_wait, method_wait)))
+            headers["X-Rate-Limit-Type"] = "application" if app_wait >= method_wait else "method"
+            return 429, headers, {"status": {"message": "Rate limit exceeded", "status_code": 429}}
+
+        if error:
+            with self.lock:
+                self.errors += 1
+            return 503, headers, {"status": {"message": "Service unavailable", "status_code": 503}}
+
+        world = self.worlds.get(region)
+        status, body = self._route(world, method, parts, parse_qs(url.query)) if world else (404, None)
+        if body is None:
+            body = {"status": {"message": "Data not found", "status_code": 404}}
+        return status, headers, body
+
+    def start(self) -> "StandIn":
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes, with nagle on the
+            # body waits for the client's delayed ack, about 40ms a request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if standin.latency > 0:
+                    time.sleep(standin.latency * standin.rng.uniform(0.5, 1.5))
+                status, headers, body = standin.handle(self.path)
+                payload = json.dumps(body).encode()
+
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json;charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def api_url(self) -> str:
+        # template for settings.API_URL / client.API_URL
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{{region}}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
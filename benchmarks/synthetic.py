@@ -0,0 +1,233 @@
+import os
+import json
+import random
+
+
+# lane and role as riot reports them in the participant timeline
+POSITIONS = [
+    ("TOP", "SOLO"),
+    ("JUNGLE", "NONE"),
+    ("MIDDLE", "SOLO"),
+    ("BOTTOM", "DUO_CARRY"),
+    ("BOTTOM", "DUO_SUPPORT"),
+]
+
+PATCHES = ["10.12.327.9290", "10.13.326.4870", "10.14.330.6592"]
+
+
+def make_match(game_id: int, rng: random.Random, accounts: list, platform="EUW1", champions=150, players=None) -> dict:
+    # a match-v4 payload with every field read by the extractor,
+    # played by players or by 10 of accounts
+    winner = rng.choice([100, 200])
+    players = players or rng.sample(accounts, 10)
+    picked = rng.sample(range(1, champions + 1), 20)
+
+    participants = []
+    identities = []
+    for i in range(10):
+        team = 100 if i < 5 else 200
+        lane, role = POSITIONS[i % 5]
+        account = players[i]
+
+        identities.append({
+            "participantId": i + 1,
+            "player": {
+                "platformId": platform,
+                "accountId": account,
+                "summonerName": f"summoner {account[-6:]}",
+                "summonerId": f"s{account}",
+                "currentPlatformId": platform,
+                "currentAccountId": account,
+                "profileIcon": rng.randint(1, 4000),
+            },
+        })
+
+        participants.append({
+            "participantId": i + 1,
+            "teamId": team,
+            "championId": picked[i],
+            "spell1Id": 4,
+            "spell2Id": rng.choice([7, 11, 12, 14]),
+            "stats": {
+                "participantId": i + 1,
+                "win": team == winner,
+                "kills": rng.randint(0, 15),
+                "deaths": rng.randint(0, 12),
+                "assists": rng.randint(0, 20),
+                "totalDamageDealtToChampions": rng.randint(2000, 60000),
+                "totalHeal": rng.randint(0, 15000),
+                "totalUnitsHealed": rng.randint(0, 6),
+                "damageSelfMitigated": rng.randint(1000, 50000),
+                "totalTimeCrowdControlDealt": rng.randint(0, 1200),
+                "totalDamageTaken": rng.randint(5000, 50000),
+                "firstBloodKill": rng.random() < 0.1,
+                "firstBloodAssist": rng.random() < 0.1,
+                "killingSprees": rng.randint(0, 5),
+                "longestTimeSpentLiving": rng.randint(100, 2000),
+                "doubleKills": rng.randint(0, 3),
+                "tripleKills": rng.randint(0, 1),
+                "quadraKills": int(rng.random() < 0.02),
+                "pentaKills": int(rng.random() < 0.005),
+                "damageDealtToObjectives": rng.randint(0, 30000),
+                "damageDealtToTurrets": rng.randint(0, 12000),
+                "totalMinionsKilled": rng.randint(0, 350),
+                "neutralMinionsKilled": rng.randint(0, 200),
+                "neutralMinionsKilledEnemyJungle": rng.randint(0, 25),
+                "wardsPlaced": rng.randint(0, 60),
+                "wardsKilled": rng.randint(0, 15),
+                "goldEarned": rng.randint(5000, 20000),
+                "champLevel": rng.randint(8, 18),
+            },
+            "timeline": {
+                "participantId": i + 1,
+                "lane": lane,
+                "role": role,
+                "creepsPerMinDeltas": {"0-10": rng.uniform(0, 9), "10-20": rng.uniform(0, 10)},
+                "xpPerMinDeltas": {"0-10": rng.uniform(250, 550), "10-20": rng.uniform(300, 700)},
+                "goldPerMinDeltas": {"0-10": rng.uniform(150, 450), "10-20": rng.uniform(250, 600)},
+                "damageTakenPerMinDeltas": {"0-10": rng.uniform(100, 500), "10-20": rng.uniform(200, 900)},
+            },
+        })
+
+    teams = []
+    for t, team in enumerate([100, 200]):
+        teams.append({
+            "teamId": team,
+            "win": "Win" if team == winner else "Fail",
+            "firstBlood": rng.random() < 0.5,
+            "towerKills": rng.randint(0, 11),
+            "bans": [{"championId": picked[10 + t * 5 + k], "pickTurn": t * 5 + k + 1}
+                     for k in range(5)],
+        })
+
+    return {
+        "gameId": game_id,
+        "platformId": platform,
+        "gameCreation": game_timestamp(game_id),
+        "gameDuration": rng.randint(900, 2700),
+        "queueId": 420,
+        "mapId": 11,
+        "seasonId": 13,
+        "gameVersion": rng.choice(PATCHES),
+        "gameMode": "CLASSIC",
+        "gameType": "MATCHED_GAME",
+        "teams": teams,
+        "participants": participants,
+        "participantIdentities": identities,
+    }
+
+
+def make_accounts(n: int, rng: random.Random) -> list:
+    return ["".join(rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
+                    for _ in range(56)) for _ in range(n)]
+
+
+def make_matches(n: int, seed=12, n_accounts=2000, first_id=4700000000) -> list:
+    rng = random.Random(seed)
+    accounts = make_accounts(n_accounts, rng)
+
+    return [make_match(first_id + i, rng, accounts) for i in range(n)]
+
+
+def game_timestamp(game_id: int) -> int:
+    return 1592000000000 + game_id * 1000
+
+
+class World:
+    # a seeded ladder of players and the games they played together,
+    # served as league-v4, summoner-v4 and match-v4 payloads
+
+    def __init__(self, players=200, games_per_player=20, platform="EUW1", seed=12, first_id=4700000000):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.platform = platform
+        self.accounts = make_accounts(players, rng)
+        self.summoners = {f"s{account}": account for account in self.accounts}
+
+        # every game is played by 10 players of the ladder
+        self.games = {}
+        self.history = {account: [] for account in self.accounts}
+        for i in range(players * games_per_player // 10):
+            game_id = first_id + i
+            self.games[game_id] = rng.sample(self.accounts, 10)
+            for account in self.games[game_id]:
+                self.history[account].append(game_id)
+
+        # the first tenth of the ladder is in master+, the rest in diamond I
+        self.tiers = {}
+        masters = max(players // 10, 3)
+        for i, account in enumerate(self.accounts):
+            self.tiers[account] = ["CHALLENGER", "GRANDMASTER", "MASTER"][i % 3] if i < masters else "DIAMOND"
+
+    def _entry(self, account: str) -> dict:
+        return {
+            "leagueId": "00000000-0000-0000-0000-000000000000",
+            "queueType": "RANKED_SOLO_5x5",
+            "tier": self.tiers[account],
+            "rank": "I",
+            "summonerId": f"s{account}",
+            "summonerName": f"summoner {account[-6:]}",
+            "leaguePoints": len(self.history[account]) * 7,
+            "wins": len(self.history[account]),
+            "losses": len(self.history[account]) // 2,
+            "veteran": False,
+            "inactive": False,
+            "freshBlood": False,
+            "hotStreak": False,
+        }
+
+    def league(self, tier: str) -> dict:
+        # challengerleagues, grandmasterleagues or masterleagues
+        entries = [self._entry(x) for x in self.accounts if self.tiers[x] == tier]
+        for entry in entries:
+            del entry["tier"]
+        return {"tier": tier, "leagueId": "00000000-0000-0000-0000-000000000000",
+                "queue": "RANKED_SOLO_5x5", "name": "Synthetic", "entries": entries}
+
+    def entries(self, tier: str, division: str, page: int, page_size=205) -> list:
+        found = [self._entry(x) for x in self.accounts
+                 if self.tiers[x] == tier and division == "I"]
+        return found[(page - 1) * page_size:page * page_size]
+
+    def summoner(self, summoner_id: str) -> dict:
+        account = self.summoners.get(summoner_id)
+        if account is None:
+            return None
+        return {"id": summoner_id, "accountId": account, "puuid": f"p{account}",
+                "name": f"summoner {account[-6:]}", "profileIconId": 4000,
+                "revisionDate": 1592000000000, "summonerLevel": 200}
+
+    def matchlist(self, account_id: str, begin_time=0, begin_index=0) -> dict:
+        # newest first, 100 per page like match-v4
+        games = sorted((x for x in self.history.get(account_id, [])
+                        if game_timestamp(x) >= begin_time), reverse=True)
+        page = games[begin_index:begin_index + 100]
+        return {"matches": [{"platformId": self.platform, "gameId": x, "champion": 1,
+                             "queue": 420, "season": 13, "timestamp": game_timestamp(x),
+                             "role": "SOLO", "lane": "TOP"} for x in page],
+                "startIndex": begin_index, "endIndex": begin_index + len(page),
+                "totalGames": len(games)}
+
+    def match(self, game_id: int) -> dict:
+        players = self.games.get(game_id)
+        if players is None:
+            return None
+        match = make_match(game_id, random.Random(self.seed * 1000003 + game_id),
+                           self.accounts, self.platform, players=players)
+        match["gameCreation"] = game_timestamp(game_id)
+        return match
+
+
+def make_static(path: str, champions=150):
+    # Data Dragon fixture for every patch above, for offline runs with
+    # STATIC_PATH=path STATIC_OFFLINE=1
+    versions = [".".join(x.split(".")[:2]) + ".1" for x in reversed(PATCHES)]
+    data = {"data": {f"Champion{key}": {"key": str(key), "name": f"Champion {key}"}
+                     for key in range(1, champions + 1)}}
+
+    for version in versions:
+        os.makedirs(f"{path}/{version}", exist_ok=True)
+        with open(f"{path}/{version}/champion.json", "w") as f:
+            json.dump(data, f)
+    with open(f"{path}/versions.json", "w") as f:
+        json.dump(versions, f)
@@ -0,0 +1,220 @@
+import os
+import glob
+import threading
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import STATS_COLUMNS, LANES
+
+
+# stats averaged into every category score, from notebook 8
+GENERAL_KEYS = {
+    "Combat": ["dmg_total", "dmg_takenpm_10", "killing_sprees", "double_kills", "triple_kills", "quadra_kills", "penta_kills"],
+    "Survivability": ["longest_time_alive", "healing_total", "damage_mitigated"],
+    "Laning": ["xppm_10", "cspm_10", "goldpm_10", "dmg_takenpm_10", "first_blood"],
+    "Objectives": ["first_blood", "dmg_to_objectives", "dmg_to_turrets", "total_cs"],
+    "Supporting": ["units_healed", "crowd_control", "wards_placed", "wards_killed"],
+    "Jungling": ["jungle_cs", "jungle_invaded", "wards_placed", "wards_killed", "first_blood"],
+}
+
+
+class AggregateStore:
+    # running count, sum, min and max of every stat per (account, lane, won),
+    # updated one chunk at a time so scouting queries never rescan matches
+
+    def __init__(self, path: str, min_games=10, scale=20):
+        self.path = path
+        self.min_games = min_games
+        self.scale = scale
+        self.lock = threading.Lock()
+        self.splits = {}
+        self._load()
+
+    def _load(self):
+        width = len(STATS_COLUMNS)
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.accounts = data["accounts"].tolist()
+                self.lanes = data["lanes"]
+                self.won = data["won"]
+                self.counts = data["counts"]
+                self.sums = data["sums"]
+                self.mins = data["mins"]
+                self.maxs = data["maxs"]
+                self.chunks = set(data["chunks"].tolist())
+        else:
+            self.accounts = []
+            self.lanes = np.empty(0, dtype=np.int8)
+            self.won = np.empty(0, dtype=np.int8)
+            self.counts = np.empty(0, dtype=np.int64)
+            self.sums = np.empty((0, width), dtype=np.float64)
+            self.mins = np.empty((0, width), dtype=np.float64)
+            self.maxs = np.empty((0, width), dtype=np.float64)
+            self.chunks = set()
+
+        self.rows = {(account, int(lane), int(won)): i for i, (account, lane, won)
+                     in enumerate(zip(self.accounts, self.lanes.tolist(), self.won.tolist()))}
+
+    def _grow(self, groups: list):
+        # rows for the (account, lane, won) groups never seen before
+        new = [group for group in groups if group not in self.rows]
+        if len(new) == 0:
+            return
+
+        for group in new:
+            self.rows[group] = len(self.accounts)
+            self.accounts.append(group[0])
+
+        width = len(STATS_COLUMNS)
+        self.lanes = np.concatenate(
+            [self.lanes, np.array([group[1] for group in new], dtype=np.int8)])
+        self.won = np.concatenate(
+            [self.won, np.array([group[2] for group in new], dtype=np.int8)])
+        self.counts = np.concatenate(
+            [self.counts, np.zeros(len(new), dtype=np.int64)])
+        self.sums = np.concatenate([self.sums, np.zeros((len(new), width))])
+        self.mins = np.concatenate(
+            [self.mins, np.full((len(new), width), np.inf)])
+        self.maxs = np.concatenate(
+            [self.maxs, np.full((len(new), width), -np.inf)])
+
+    def update(self, player_match_stats: pd.DataFrame, chunk: str) -> bool:
+        # add a chunk of player_match_stats (or merged_stats), a chunk
+        # already added is skipped so reruns never count games twice
+        with self.lock:
+            if chunk in self.chunks:
+                return False
+
+            frame = player_match_stats.assign(
+                lane=pd.Categorical(player_match_stats["lane"], categories=LANES).codes)
+            frame = frame.loc[frame["lane"] >= 0]
+            grouped = frame.groupby(["account_id", "lane", "won"], observed=True)[STATS_COLUMNS]
+            counts = grouped.size()
+            sums = grouped.sum()
+            mins = grouped.min()
+            maxs = grouped.max()
+
+            groups = [(account, int(lane), int(won))
+                      for account, lane, won in counts.index.tolist()]
+            self._grow(groups)
+            rows = np.array([self.rows[group] for group in groups], dtype=np.int64)
+
+            self.counts[rows] += counts.to_numpy()
+            self.sums[rows] += sums.to_numpy(dtype=np.float64)
+            self.mins[rows] = np.minimum(
+                self.mins[rows], mins.to_numpy(dtype=np.float64))
+            self.maxs[rows] = np.maximum(
+                self.maxs[rows], maxs.to_numpy(dtype=np.float64))
+
+            self.chunks.add(chunk)
+            self.splits = {}
+
+        return True
+
+    def update_from_chunks(self, path: str) -> int:
+        # every player_match_stats chunk pickle in path not added yet
+        added = 0
+        for file in sorted(glob.glob(f"{path}/player_match_stats_*-*.pkl")):
+            chunk = os.path.abspath(file)
+            if chunk in self.chunks:
+                continue
+            added += self.update(pd.read_pickle(file), chunk)
+
+        print(f"Chunks added to the aggregates: {added}")
+        return added
+
+    def save(self):
+        with self.lock:
+            accounts = np.array(self.accounts)
+            with open(f"{self.path}.tmp", "wb") as f:
+                np.savez(f, accounts=accounts, lanes=self.lanes, won=self.won,
+                         counts=self.counts, sums=self.sums, mins=self.mins,
+                         maxs=self.maxs, chunks=np.array(sorted(self.chunks), dtype=str))
+            os.replace(f"{self.path}.tmp", self.path)
+
+    def split(self, lane: str, won: int) -> pd.DataFrame:
+        # the notebook 8 scores of every account with more than min_games
+        # games in the lane: per account means scaled to 0-scale across
+        # accounts, then averaged into each category of GENERAL_KEYS
+        frame, _, _ = self._split(lane, won)
+        return frame
+
+    def _split(self, lane: str, won: int):
+        # scores of the split with the range used to scale them
+        key = (lane, won)
+        with self.lock:
+            if key in self.splits:
+                return self.splits[key]
+
+            rows = np.flatnonzero((self.lanes == LANES.index(lane)) & (self.won == won)
+                                  & (self.counts > self.min_games))
+            means = self.sums[rows] / self.counts[rows, None]
+            accounts = [self.accounts[i] for i in rows]
+
+        low, high = self._range(means)
+        frame = pd.DataFrame(self._scaled(means, low, high), columns=STATS_COLUMNS)
+        frame.insert(0, "account_id", accounts)
+        frame = self._categories(frame)
+
+        with self.lock:
+            self.splits[key] = (frame, low, high)
+        return self.splits[key]
+
+    def scaling(self, lane: str, won: int) -> tuple:
+        # low and high of every stat, the range the split scores are scaled to
+        _, low, high = self._split(lane, won)
+        return low, high
+
+    def _range(self, means: np.ndarray):
+        if len(means) == 0:
+            return np.zeros(len(STATS_COLUMNS)), np.ones(len(STATS_COLUMNS))
+        return means.min(axis=0), means.max(axis=0)
+
+    def _scaled(self, means: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        # same as MinMaxScaler(feature_range=(0, scale)), constant stats become 0
+        spread = np.where(high > low, high - low, 1)
+        return (means - low) / spread * self.scale
+
+    def _categories(self, frame: pd.DataFrame) -> pd.DataFrame:
+        # notebook 8 negates dmg_takenpm_10 twice, so it's kept as it is
+        return frame.assign(**{category: frame[columns].mean(axis=1)
+                               for category, columns in GENERAL_KEYS.items()})
+
+    def player(self, account_id, lane: str, won: int):
+        # scaled stats and category scores of a single player against the
+        # accounts of the split, None if they never played the lane
+        row = self.rows.get((account_id, LANES.index(lane), won))
+        if row is None:
+            return None
+
+        _, low, high = self._split(lane, won)
+        with self.lock:
+            means = self.sums[row] / self.counts[row]
+            games = int(self.counts[row])
+
+        scaled = np.clip(self._scaled(means, low, high), 0, self.scale)
+        frame = self._categories(pd.DataFrame([scaled], columns=STATS_COLUMNS))
+        player = frame.iloc[0]
+        player["games"] = games
+        return player
+
+    def average(self, lane: str, won: int) -> pd.Series:
+        # the lane average of notebook 9: mean scores of the split
+        return self.split(lane, won).drop(columns="account_id").mean()
+
+    def lane_stats(self, lane: str, won=None) -> pd.DataFrame:
+        # raw mean, min and max of every stat over all the games of a lane
+        with self.lock:
+            rows = self.lanes == LANES.index(lane)
+            if won is not None:
+                rows &= self.won == won
+            count = self.counts[rows].sum()
+            stats = pd.DataFrame({
+                "mean": self.sums[rows].sum(axis=0) / max(count, 1),
+                "min": self.mins[rows].min(axis=0, initial=np.inf),
+                "max": self.maxs[rows].max(axis=0, initial=-np.inf),
+            }, index=STATS_COLUMNS)
+
+        stats.attrs["games"] = int(count)
+        return stats
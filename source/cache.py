@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+
+class ResponseCache:
+    # raw api payloads stored compressed under the hash of their key,
+    # sqlite keeps the index used for lookups and size based eviction
+
+    def __init__(self, path: str, max_size=20 * 1024 ** 3):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        os.makedirs(f"{path}/records", exist_ok=True)
+        self.db = sqlite3.connect(
+            f"{path}/index.sqlite", check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed)")
+        self.db.commit()
+
+        self.size = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM records").fetchone()[0]
+
+    def _file(self, digest: str) -> str:
+        return f"{self.path}/records/{digest[:2]}/{digest}.z"
+
+    def get_raw(self, key: str, max_age=None) -> bytes:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, created FROM records WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            digest, created = row
+            if max_age is not None and time.time() - created > max_age:
+                return None
+            self.db.execute(
+                "UPDATE records SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+
+        try:
+            with open(self._file(digest), "rb") as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+    def get(self, key: str, max_age=None):
+        payload = self.get_raw(key, max_age)
+        if payload is None:
+            return None
+        return json.loads(payload)
+
+    def put(self, key: str, payload: bytes):
+        digest = hashlib.sha1(payload).hexdigest()
+        data = zlib.compress(payload, 6)
+
+        # write the record first so the index never points to a missing file,
+        # through a temporary file of its own as threads may put the same payload
+        file = self._file(digest)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, file)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        with self.lock:
+            now = time.time()
+            old = self.db.execute(
+                "SELECT size FROM records WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                (key, digest, len(data), now, now))
+            self.db.commit()
+            self.size += len(data) - (old[0] if old is not None else 0)
+
+            if self.size > self.max_size:
+                self._evict(self.max_size * 0.9)
+
+    def _evict(self, target: float):
+        # drop the least recently used records until we are under target
+        rows = self.db.execute(
+            "SELECT key, digest, size FROM records ORDER BY accessed")
+        evicted = []
+        for key, digest, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key, digest))
+            self.size -= size
+
+        for key, digest in evicted:
+            self.db.execute("DELETE FROM records WHERE key = ?", (key,))
+        self.db.commit()
+
+        # identical payloads share a file, only remove unreferenced ones
+        for key, digest in evicted:
+            shared = self.db.execute(
+                "SELECT 1 FROM records WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            if shared is None:
+                try:
+                    os.remove(self._file(digest))
+                except OSError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            self.db.close()
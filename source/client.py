@@ -0,0 +1,112 @@
+import time
+import random
+import threading
+
+from urllib.parse import urlsplit
+
+import requests as req
+from requests.adapters import HTTPAdapter
+
+from source.limiter import RateLimiter
+from source.metrics import metrics
+from source.settings import API_URL
+
+
+# one pooled session shared by every fetcher so connections are kept alive
+_session = None
+_session_lock = threading.Lock()
+
+# riot counts limits per routing value, so every region host gets its
+# own request budget shared by the workers of that region
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_session(pool_size=32) -> req.Session:
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = req.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+
+    return _session
+
+
+def api_url(region: str, path: str) -> str:
+    # e.g. api_url("kr", "/lol/league/v4/entries")
+    return API_URL.format(region=region.lower()) + path
+
+
+def get_limiter(url: str) -> RateLimiter:
+    # everything before the api path, the region host or an API_URL
+    # with the region in its path
+    base = url.split("/lol/")[0]
+    with _limiters_lock:
+        if base not in _limiters:
+            _limiters[base] = RateLimiter()
+        return _limiters[base]
+
+
+def endpoint(url: str) -> str:
+    # e.g. /lol/match/v4/matches/123 -> lol/match/v4/matches, anything
+    # before /lol/ is left out like in get_limiter
+    path = urlsplit(url).path
+    if "/lol/" in path:
+        path = path[path.index("/lol/"):]
+    return "/".join(path.strip("/").split("/")[:4])
+
+
+def backoff(attempt: int, base=1.0, cap=60.0) -> float:
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+def get(url: str, retries=5) -> req.Response:
+    method = endpoint(url)
+    limiter = get_limiter(url)
+
+    for attempt in range(retries + 1):
+        metrics.throttle(method, limiter.acquire(method))
+
+        began = time.monotonic()
+        try:
+            res = get_session().get(url, timeout=30)
+        except (req.ConnectionError, req.Timeout) as e:
+            metrics.request(method, "error", time.monotonic() - began)
+            if attempt == retries:
+                raise
+            print(f"Retrying {method}, {e}")
+            time.sleep(backoff(attempt))
+            continue
+
+        metrics.request(method, res.status_code, time.monotonic() - began)
+        limiter.update(method, res.headers)
+
+        # throttled, wait as long as riot tells us to
+        if res.status_code == 429 and attempt < retries:
+            retry_after = res.headers.get("Retry-After")
+            wait = float(retry_after) if retry_after else backoff(attempt)
+            scope = method if res.headers.get(
+                "X-Rate-Limit-Type") == "method" else None
+            print(f"Rate limited at {method}, waiting {wait:.1f}s")
+            limiter.block(wait, scope)
+            continue
+
+        # transient server errors
+        if res.status_code >= 500 and attempt < retries:
+            time.sleep(backoff(attempt))
+            continue
+
+        return res
+
+    return res
+
+
+def error_message(res: req.Response) -> str:
+    try:
+        return res.json()["status"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return str(res.status_code)
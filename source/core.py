@@ -1,17 +1,40 @@
-from source.settings import TOKEN
+from source.settings import TOKEN, REGION, REGIONS, CACHE_PATH, INDEX_PATH, DIMENSIONS_PATH, AGGREGATES_PATH, MODELS_PATH, METRICS_PATH
+from source.cache import ResponseCache
+from source.journal import Journal, RefreshState
+from source.dedup import GameIndex, game_keys
+from source.dimensions import Dimensions
+from source.aggregates import AggregateStore
+from source.metrics import metrics
 import source.players as players
 import source.matches as matches
-
+import source.crawler as crawler
+import source.merge as merge
+import source.matchups as matchups
+import source.meta as meta
+import source.training as training
+from source.database import Database
+import source.reports as reports
+
+import os
 import time
 from datetime import datetime, timedelta
 
 import pandas as pd
 
 
+def input_region() -> str:
+    return input(f"region ({REGION}): ").strip() or REGION
+
+
+def dump_metrics():
+    # requests, throttling and stage timings of everything run so far
+    metrics.dump(METRICS_PATH)
+
+
 def init_players_get_entries():
 
     path = input("folder path: ")
-    players.get_entries(path, TOKEN)
+    players.get_entries(path, TOKEN, region=input_region())
 
 
 def init_players_get_account_info():
@@ -26,7 +49,9 @@ def init_players_get_account_info():
     start = int(input("start index: "))
     end = int(input("end index: "))
 
-    players.get_account_info(id_list, TOKEN, path, start, end)
+    players.get_account_info(id_list, TOKEN, path, start, end,
+                             journal=Journal(f"{path}/journal.sqlite", "account_info"),
+                             region=input_region())
 
 
 def init_players_merge_with():
@@ -46,7 +71,9 @@ def init_players_get_match_history():
 
     days_ago = int(input("How many days ago: "))
 
-    days_ago = datetime.now() - timedelta(days=days_ago)
+    # start of the day, so a restart on the same day resumes the same journal
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days_ago = today - timedelta(days=days_ago)
     days_ago = round(time.mktime(days_ago.timetuple()) * 1000)
 
     path = input("folder path: ")
@@ -55,7 +82,10 @@ def init_players_get_match_history():
     end = int(input("end index: "))
 
     players.get_match_history(players_acc_id, TOKEN,
-                              path, start, end, begin_time=days_ago)
+                              path, start, end, begin_time=days_ago,
+                              cache=ResponseCache(CACHE_PATH),
+                              journal=Journal(f"{path}/journal.sqlite", f"match_history_{days_ago}"),
+                              index=GameIndex(INDEX_PATH), region=input_region())
 
 
 def init_get_matches_data():
@@ -65,5 +95,131 @@ def init_get_matches_data():
 
     start = int(input("start index: "))
     end = int(input("end index: "))
+    output = input("output (pickle/dataset): ")
+    # e.g. after an extractor change, into a new folder
+    reprocess = input("extract downloaded games again from the cache (y/N): ").strip().lower() == "y"
+
+    matches.get_matches(id_list, path, TOKEN, start, end,
+                        cache=ResponseCache(CACHE_PATH), stream=True,
+                        index=GameIndex(INDEX_PATH), output=output,
+                        dimensions=Dimensions(DIMENSIONS_PATH), region=input_region(),
+                        reprocess=reprocess)
+
+
+def init_crawl():
+    days_ago = int(input("How many days ago: "))
+
+    days_ago = datetime.now() - timedelta(days=days_ago)
+    days_ago = round(time.mktime(days_ago.timetuple()) * 1000)
+
+    path = input("folder path: ")
+    workers = int(input("workers per stage: "))
+    output = input("output (pickle/dataset): ")
+    regions = input(f"regions ({','.join(REGIONS)}): ").strip()
+    regions = regions.split(",") if regions else REGIONS
+
+    # every region is crawled at the same time with its own request budget
+    crawler.crawl_regions(path, TOKEN, [x.strip() for x in regions],
+                          begin_time=days_ago, workers=workers,
+                          cache=ResponseCache(CACHE_PATH), index=GameIndex(INDEX_PATH),
+                          output=output, dimensions=Dimensions(DIMENSIONS_PATH))
+
+
+def init_refresh_matches():
+    players_acc_id = pd.read_pickle(
+        "raw_data/players_pool_account.pkl")["accountId"].to_list()
+    print(f"size of players_id_list: {len(players_acc_id)}")
+
+    # only used for accounts that were never refreshed before
+    days_ago = int(input("How many days ago for new players: "))
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days_ago = today - timedelta(days=days_ago)
+    days_ago = round(time.mktime(days_ago.timetuple()) * 1000)
+
+    path = input("folder path: ")
+    region = input_region()
+    cache = ResponseCache(CACHE_PATH)
+    index = GameIndex(INDEX_PATH)
+
+    state = RefreshState(f"{path}/refresh.sqlite")
+    players.refresh_match_history(players_acc_id, TOKEN, path, state,
+                                  begin_time=days_ago, cache=cache, index=index,
+                                  region=region)
+
+    # every run gets its own folder so chunks never clash with older runs,
+    # even those of the same day
+    id_list = pd.read_pickle(f"{path}/new_match_ids.pkl")["gameId"].to_list()
+    matches_path = f"{path}/{datetime.now():%Y-%m-%d_%H%M%S}"
+    os.makedirs(matches_path, exist_ok=True)
+
+    matches.get_matches(id_list, matches_path, TOKEN, 0, len(id_list),
+                        cache=cache, stream=True, index=index,
+                        dimensions=Dimensions(DIMENSIONS_PATH), region=region)
+
+    # games that failed to download are handed out again next refresh
+    fetched = index.is_fetched(game_keys(region, id_list))
+    state.clear_pending([id for id, done in zip(id_list, fetched) if done])
+
+    # only the new chunks are added to the scouting aggregates
+    aggregates = AggregateStore(AGGREGATES_PATH)
+    aggregates.update_from_chunks(matches_path)
+    aggregates.save()
+
+
+def init_merge_matches_data():
+    path = input("chunks folder path: ")
+    output_path = input("output folder path: ")
+
+    merged = merge.merge_files(path, output_path)
+    merge.merge_stats(merged, output_path)
+    matchups.merge_files(path, output_path)
+    meta.merge_files(path, output_path)
+
+
+def init_train_models():
+    merged_path = input("merged data folder path: ")
+    features_path = input("features folder path: ")
+    output_path = input("output folder path: ")
+    folds = int(input("folds (1 for a 90/10 split): ") or 1)
+    workers = int(input("worker processes: ") or os.cpu_count())
+
+    training.train_models(merged_path, features_path, output_path,
+                          folds=folds, workers=workers)
+
+
+def init_update_models():
+    # only the chunks not seen before are trained on
+    path = input("chunks folder path: ")
+    output_path = input("output folder path: ")
+
+    models = training.LaneModels(MODELS_PATH)
+    models.update_from_chunks(path)
+    models.save()
+
+    models.lane_features().to_pickle(f"{output_path}/lane_features.pkl", protocol=4)
+    print(models.accuracy())
+    print(f"File saved at {output_path}/lane_features.pkl")
+
+
+def init_load_database():
+    # chunks loaded twice only overwrite their own rows
+    path = input("chunks folder path: ")
+
+    database = Database()
+    database.load_chunks(path)
+    database.close()
+
+
+def init_scouting_reports():
+    # kpis are the key features of each lane when the win predictors exist
+    path = input("reports folder path: ")
+    workers = int(input("worker processes: ") or os.cpu_count())
+
+    features = None
+    if os.path.exists(MODELS_PATH):
+        features = training.LaneModels(MODELS_PATH).lane_features().iloc[0].to_dict()
 
-    matches.get_matches(id_list, path, TOKEN, start, end)
+    reports.generate(AggregateStore(AGGREGATES_PATH), path,
+                     features=features, workers=workers,
+                     dimensions=Dimensions(DIMENSIONS_PATH))
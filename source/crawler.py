@@ -0,0 +1,177 @@
+import os
+import queue
+import threading
+
+import pandas as pd
+
+import source.players as players
+import source.matches as matches
+import source.extractor as extractor
+from source.dedup import game_keys
+from source.metrics import metrics
+from source.settings import REGION
+
+
+# marks the end of a stage input
+_DONE = object()
+
+
+def _stage(name: str, func, in_q: queue.Queue, out_q: queue.Queue, workers: int, downstream: int) -> threading.Thread:
+    # runs func over every item of in_q on a pool of threads,
+    # each call returns an iterable of items for out_q
+
+    def work():
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                break
+            try:
+                for result in func(item):
+                    out_q.put(result)
+            except Exception as e:
+                print(f"Skipping {item} at {name}, {e}")
+
+    threads = [threading.Thread(target=work, daemon=True)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # once every worker is done let the next stage know
+    def close():
+        for thread in threads:
+            thread.join()
+        for _ in range(downstream):
+            out_q.put(_DONE)
+
+    closer = threading.Thread(target=close, daemon=True)
+    closer.start()
+
+    return closer
+
+
+def crawl(path: str, token: str, begin_time=1593475200000, queue_id=420, workers=4, queue_size=1000, chunk_size=1000, cache=None, index=None, output="pickle", dimensions=None, region=REGION, **entries_kwargs):
+    # ladder -> summoner ids -> account ids -> match ids -> matches,
+    # every stage starts working as soon as its first item arrives
+
+    summoners_q = queue.Queue(maxsize=queue_size)
+    accounts_q = queue.Queue(maxsize=queue_size)
+    games_q = queue.Queue(maxsize=queue_size)
+    matches_q = queue.Queue(maxsize=queue_size)
+
+    lock = threading.Lock()
+    entries = []
+    accounts = []
+    match_ids = []
+    seen_summoners = set()
+    seen_games = set()
+
+    # stage 1: the ladder, paged by a single thread
+    def ladder():
+        try:
+            for entry in players.iter_entries(token, region=region, **entries_kwargs):
+                entries.append(entry)
+                with lock:
+                    if entry["summonerId"] in seen_summoners:
+                        continue
+                    seen_summoners.add(entry["summonerId"])
+                summoners_q.put(entry["summonerId"])
+        finally:
+            for _ in range(workers):
+                summoners_q.put(_DONE)
+
+    # stage 2: summoner id -> account id
+    def account(summoner_id):
+        info = players.fetch_account(summoner_id, token, region)
+        if info is not None:
+            accounts.append(
+                {"summonerId": info["id"], "accountId": info["accountId"]})
+            yield info["accountId"]
+
+    # stage 3: account id -> unseen game ids
+    def match_list(account_id):
+        listed = players.fetch_match_list(
+            account_id, token, begin_time, queue_id, cache, region=region)
+        if index is not None:
+            keys = game_keys(region, [match["gameId"] for match in listed])
+            index.add(keys)
+            fetched = index.is_fetched(keys)
+        else:
+            fetched = [False] * len(listed)
+
+        for match, done in zip(listed, fetched):
+            match_ids.append(
+                {"gameId": match["gameId"], "timestamp": match["timestamp"]})
+            with lock:
+                # downloaded by this or an earlier run
+                if done or match["gameId"] in seen_games:
+                    continue
+                seen_games.add(match["gameId"])
+            yield match["gameId"]
+
+    # stage 4: game id -> match data
+    def match_data(game_id):
+        match = matches.fetch_match(game_id, token, cache, region)
+        if match is not None:
+            yield match
+
+    threading.Thread(target=ladder, daemon=True).start()
+    _stage("account info", account, summoners_q, accounts_q, workers, workers)
+    _stage("match history", match_list, accounts_q, games_q, workers, workers)
+    _stage("matches", match_data, games_q, matches_q, workers, 1)
+
+    # stage 5: extraction as matches arrive, saved in chunks on the main thread,
+    # numbered after the chunks earlier runs left in path
+    chunk = extractor.MatchExtractor(capacity=chunk_size)
+    first = extractor.saved_end(path, output)
+    n_matches = 0
+
+    while True:
+        match = matches_q.get()
+        if match is _DONE:
+            break
+        chunk.add(match)
+
+        if len(chunk) >= chunk_size:
+            chunk.save(path, first + n_matches, first + n_matches + len(chunk),
+                       output=output, dimensions=dimensions)
+            matches.mark_fetched(chunk, index)
+            n_matches += len(chunk)
+            chunk = extractor.MatchExtractor(capacity=chunk_size)
+            print(f"Number of Matches so far: {n_matches}, "
+                  f"{metrics.rate('fetch_match'):.1f} matches/s")
+
+    if len(chunk) > 0:
+        chunk.save(path, first + n_matches, first + n_matches + len(chunk),
+                   output=output, dimensions=dimensions)
+        matches.mark_fetched(chunk, index)
+        n_matches += len(chunk)
+
+    # store the intermediate tables of the crawl
+    players_pool = players.entries_to_frame(entries)
+    players_pool.to_pickle(f"{path}/players_pool.pkl", protocol=4)
+
+    account_info = pd.DataFrame(
+        accounts, columns=["summonerId", "accountId"])
+    account_info.to_pickle(f"{path}/account_info.pkl", protocol=4)
+    players.merge_with(players_pool, account_info, path)
+
+    match_ids = pd.DataFrame(match_ids, columns=["gameId", "timestamp"])
+    match_ids.to_pickle(f"{path}/match_ids.pkl", protocol=4)
+
+    print(f"Done, number of matches: {n_matches}")
+
+
+def crawl_regions(path: str, token: str, regions: list, **kwargs):
+    # one crawl per region on its own threads, each with the request budget
+    # of its region, into {path}/{region}; cache, index and dimensions
+    # can be shared by every region
+    shards = []
+    for region in regions:
+        os.makedirs(f"{path}/{region}", exist_ok=True)
+        shard = threading.Thread(target=crawl, args=(f"{path}/{region}", token),
+                                 kwargs={**kwargs, "region": region})
+        shard.start()
+        shards.append(shard)
+
+    for shard in shards:
+        shard.join()
@@ -0,0 +1,223 @@
+import glob
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import TABLES, STATS_TABLES, STATS_KEYS, DTYPES, LANES
+from source.merge import shard_paths, concat_frames
+from source.settings import HOST, USERNAME, PASSWORD, DB, DB_BACKEND
+
+
+# primary key of every table stored as it is, a chunk loaded twice
+# overwrites its own rows
+KEYS = {
+    "match_info": ["match_id"],
+    "champion_bans": ["match_id", "pick_turn"],
+    "champion_picks": ["match_id", "champion"],
+    "players_info": ["account_id"],
+    "player_match_stats": ["match_id", "account_id"],
+}
+
+# the tables that repeat on purpose and the stats tables are views of
+# player_match_stats, like extractor.stats_view
+VIEWS = {
+    "players_lanes": "SELECT account_id, lane, won FROM player_match_stats",
+    "players_champions": "SELECT account_id, champion, won FROM player_match_stats",
+    **{table: f"SELECT {', '.join([*STATS_KEYS, *(column for column, _ in fields), 'won'])} "
+              f"FROM player_match_stats WHERE stats_level >= {level}"
+       for level, (table, fields) in enumerate(STATS_TABLES.items(), start=1)},
+}
+
+SQL_TYPES = {
+    "int8": "TINYINT",
+    "int16": "SMALLINT",
+    "int32": "INT",
+    "int64": "BIGINT",
+    "float32": "FLOAT",
+    "float64": "DOUBLE",
+    "bool": "BOOLEAN",
+}
+
+
+def _sql_type(dtype) -> str:
+    if isinstance(dtype, pd.PeriodDtype):
+        return "DATE"
+    return SQL_TYPES.get(str(dtype), "VARCHAR(128)")
+
+
+def _values(frame: pd.DataFrame) -> list:
+    # rows as tuples of python values, built a column at a time
+    columns = []
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.PeriodDtype):
+            column = column.astype(str)
+        if isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object:
+            column = column.astype(object).where(column.notna(), None)
+        columns.append(column.tolist())
+    return list(zip(*columns))
+
+
+def _typed(columns: list, rows: list) -> pd.DataFrame:
+    # a chunk of rows turned into the dtypes of the extracted tables
+    data = dict(zip(columns, zip(*rows))) if rows else {column: () for column in columns}
+    frame = {}
+    for column, values in data.items():
+        if column in DTYPES:
+            frame[column] = np.array(values, dtype=DTYPES[column])
+        elif column == "lane":
+            frame[column] = pd.Categorical(values, categories=LANES)
+        elif column in ["region", "patch", "winner"]:
+            frame[column] = pd.Categorical(values)
+        elif column == "date_created":
+            frame[column] = pd.to_datetime(pd.Series(values, dtype=object).astype(str)).dt.to_period("D")
+        else:
+            frame[column] = pd.Series(values, dtype=object)
+
+    return pd.DataFrame(frame)
+
+
+class Database:
+    # the extracted tables in mysql (pymysql, the settings of notebook 7)
+    # or in a sqlite file at DB, loaded with batched upserts and read back
+    # a chunk at a time
+
+    def __init__(self, backend=DB_BACKEND, host=HOST, user=USERNAME, password=PASSWORD, db=DB):
+        self.backend = backend
+        self.lock = threading.RLock()
+
+        if backend == "sqlite":
+            self.connection = sqlite3.connect(db, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.param = "?"
+        else:
+            import pymysql
+            self.connection = pymysql.connect(host=host, user=user, password=password,
+                                              db=db, charset="utf8mb4")
+            self.param = "%s"
+
+        self.created = set()
+
+    def _tables(self) -> set:
+        if self.backend == "sqlite":
+            query = "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')"
+        else:
+            query = "SHOW FULL TABLES"
+        cursor = self.connection.cursor()
+        cursor.execute(query)
+        return {row[0] for row in cursor.fetchall()}
+
+    def _create(self, table: str, frame: pd.DataFrame):
+        # tables take the dtypes of the first frame loaded, so chunks
+        # extracted with dimensions get integer keys
+        if table in self.created:
+            return
+        existing = self._tables()
+
+        if table not in existing:
+            columns = ", ".join(f"{column} {_sql_type(dtype)}"
+                                for column, dtype in frame.dtypes.items())
+            self.connection.cursor().execute(
+                f"CREATE TABLE {table} ({columns}, PRIMARY KEY ({', '.join(KEYS[table])}))")
+            if table == "player_match_stats":
+                self.connection.cursor().execute(
+                    "CREATE INDEX account_lane ON player_match_stats (account_id, lane)")
+
+        if table == "player_match_stats":
+            for view, query in VIEWS.items():
+                if view not in existing:
+                    self.connection.cursor().execute(f"CREATE VIEW {view} AS {query}")
+
+        self.connection.commit()
+        self.created.add(table)
+
+    def _upsert(self, table: str, columns: list) -> str:
+        names = ", ".join(columns)
+        params = ", ".join([self.param] * len(columns))
+        updates = [column for column in columns if column not in KEYS[table]]
+
+        if self.backend == "sqlite":
+            update = ", ".join(f"{column} = excluded.{column}" for column in updates)
+            conflict = f"DO UPDATE SET {update}" if updates else "DO NOTHING"
+            return (f"INSERT INTO {table} ({names}) VALUES ({params}) "
+                    f"ON CONFLICT ({', '.join(KEYS[table])}) {conflict}")
+
+        update = ", ".join(f"{column} = VALUES({column})"
+                           for column in updates or KEYS[table][:1])
+        return f"INSERT INTO {table} ({names}) VALUES ({params}) ON DUPLICATE KEY UPDATE {update}"
+
+    def load(self, table: str, frame: pd.DataFrame, batch_size=10000) -> int:
+        # insert or update every row of frame, one transaction per batch
+        if table not in KEYS:
+            return 0
+
+        with self.lock:
+            self._create(table, frame)
+            statement = self._upsert(table, list(frame.columns))
+            cursor = self.connection.cursor()
+
+            for start in range(0, len(frame), batch_size):
+                cursor.executemany(statement, _values(frame.iloc[start:start + batch_size]))
+                self.connection.commit()
+
+        return len(frame)
+
+    def load_tables(self, frames: dict, batch_size=10000) -> int:
+        # e.g. load_tables(extractor.extract(raw_matches).tables())
+        return sum(self.load(table, frame, batch_size) for table, frame in frames.items())
+
+    def load_chunks(self, path: str, batch_size=10000) -> int:
+        # every chunk pickle of path and its region folders, one file in
+        # memory at a time
+        rows = 0
+        for table in [table for table in TABLES if table in KEYS]:
+            files = sorted(file for shard in shard_paths(path)
+                           for file in glob.glob(f"{shard}/{table}_*-*.pkl"))
+            for file in files:
+                rows += self.load(table, pd.read_pickle(file), batch_size)
+            print(f"Table {table} loaded, files: {len(files)}")
+
+        print(f"Rows loaded: {rows}")
+        return rows
+
+    def stream(self, query: str, params=(), chunk_size=50000):
+        # yields typed data frames of chunk_size rows, mysql sends rows as
+        # they are read (server side cursor) instead of all at once; a query
+        # without rows yields one empty frame with its columns
+        with self.lock:
+            if self.backend == "sqlite":
+                cursor = self.connection.cursor()
+            else:
+                import pymysql
+                cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+
+            try:
+                cursor.execute(query, params)
+                columns = [column[0] for column in cursor.description]
+                empty = True
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if len(rows) == 0:
+                        break
+                    empty = False
+                    yield _typed(columns, rows)
+
+                if empty:
+                    yield _typed(columns, [])
+            finally:
+                cursor.close()
+
+    def read(self, query: str, params=(), chunk_size=50000) -> pd.DataFrame:
+        return concat_frames(list(self.stream(query, params, chunk_size)))
+
+    def player_stats(self, lane: str, chunk_size=50000):
+        # what the four way join of notebook 7 returns for one lane, read
+        # from the wide table in chunks
+        yield from self.stream(
+            f"SELECT * FROM player_match_stats WHERE lane = {self.param}", (lane,), chunk_size)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
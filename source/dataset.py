@@ -0,0 +1,92 @@
+import os
+import glob
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from source.extractor import patch_key
+
+
+# partition columns of each table, in directory order
+PARTITIONS = {
+    "match_info": ["region", "patch"],
+    "champion_bans": ["region", "patch"],
+    "champion_picks": ["region", "patch", "lane"],
+    "players_lanes": ["lane"],
+    "players_champions": [],
+    "players_info": ["region"],
+    "player_match_stats": ["region", "patch", "lane"],
+    "player_laning_stats": ["region", "patch", "lane"],
+    "player_combat_stats": ["region", "patch", "lane"],
+    "player_flair_stats": ["region", "patch", "lane"],
+    "player_objective_stats": ["region", "patch", "lane"],
+}
+
+
+def write_chunk(frames: dict, path: str, name: str):
+    # every table of a chunk becomes one file per partition
+    # named after the chunk, so rewriting a chunk replaces its files
+
+    match_info = frames["match_info"].set_index("match_id")
+
+    for table, frame in frames.items():
+        partitions = PARTITIONS[table]
+
+        # tables keyed by match get the region and patch of the match
+        for column in partitions:
+            if column not in frame.columns:
+                frame = frame.assign(
+                    **{column: frame["match_id"].map(match_info[column])})
+
+        arrow_table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_to_dataset(arrow_table, f"{path}/{table}",
+                            partition_cols=partitions or None,
+                            basename_template=f"{name}-{{i}}.parquet",
+                            existing_data_behavior="overwrite_or_ignore")
+
+    # the marker is written last, if it's there the chunk is complete
+    os.makedirs(f"{path}/_chunks", exist_ok=True)
+    open(f"{path}/_chunks/{name}", "w").close()
+
+
+def chunk_saved(path: str, name: str) -> bool:
+    return os.path.exists(f"{path}/_chunks/{name}")
+
+
+def patches(path: str, table: str) -> list:
+    found = {os.path.basename(x)[len("patch="):]
+             for x in glob.glob(f"{path}/{table}/**/patch=*", recursive=True)}
+    return sorted(found, key=patch_key)
+
+
+def read_table(path: str, table: str, columns=None, lanes=None, regions=None, patch=None, min_patch=None, filter=None) -> pd.DataFrame:
+    # only the partitions matching lanes/regions/patches are opened and
+    # only the asked columns are read, e.g.
+    # read_table(path, "player_laning_stats", ["xppm_10", "won"], lanes=["TOP"], min_patch="10.12")
+
+    partitions = PARTITIONS[table]
+    dataset = ds.dataset(f"{path}/{table}", format="parquet",
+                         partitioning=ds.partitioning(
+                             pa.schema([(column, pa.string())
+                                       for column in partitions]),
+                             flavor="hive") if partitions else None)
+
+    expression = filter
+    conditions = []
+    if lanes is not None:
+        conditions.append(ds.field("lane").isin(lanes))
+    if regions is not None:
+        conditions.append(ds.field("region").isin(regions))
+    if patch is not None:
+        conditions.append(ds.field("patch") == patch)
+    if min_patch is not None:
+        selected = [x for x in patches(path, table)
+                    if patch_key(x) >= patch_key(min_patch)]
+        conditions.append(ds.field("patch").isin(selected))
+
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
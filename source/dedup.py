@@ -0,0 +1,112 @@
+import os
+import fcntl
+import tempfile
+import threading
+
+import numpy as np
+
+
+# platform ids, their position is stored in the high bits of a game key
+PLATFORMS = ["BR1", "EUN1", "EUW1", "JP1", "KR",
+             "LA1", "LA2", "NA1", "OC1", "RU", "TR1"]
+
+
+def game_keys(platform, game_ids) -> np.ndarray:
+    # one int64 per game: platform << 40 | gameId
+    game_ids = np.asarray(game_ids, dtype=np.int64)
+    if isinstance(platform, str):
+        codes = PLATFORMS.index(platform.upper())
+    else:
+        codes = np.array([PLATFORMS.index(x.upper())
+                          for x in platform], dtype=np.int64)
+
+    return (np.int64(1) << 40) * codes + game_ids
+
+
+class GameIndex:
+    # every game listed in a match history and whether it was already
+    # downloaded, kept as a sorted int64 array plus the additions since
+    # the last save
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.keys, self.fetched = self._load()
+        self.added = {}
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                return data["keys"], data["fetched"]
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    def _lookup(self, keys: np.ndarray):
+        # position of each key in the saved array and whether it's there
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    def add(self, keys) -> np.ndarray:
+        # returns which keys were never listed before
+        keys = np.asarray(keys, dtype=np.int64)
+        with self.lock:
+            _, found = self._lookup(keys)
+            new = ~found
+            for i, key in enumerate(keys.tolist()):
+                if key in self.added:
+                    new[i] = False
+                elif new[i]:
+                    self.added[key] = False
+        return new
+
+    def is_fetched(self, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        with self.lock:
+            positions, found = self._lookup(keys)
+            fetched = np.zeros(len(keys), dtype=bool)
+            fetched[found] = self.fetched[positions[found]]
+            for i, key in enumerate(keys.tolist()):
+                if self.added.get(key):
+                    fetched[i] = True
+        return fetched
+
+    def mark_fetched(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        with self.lock:
+            for key in keys.tolist():
+                self.added[key] = True
+
+    def save(self):
+        # merge with the file on disk first so other shards' games are kept,
+        # the lock file keeps processes from saving over each other between
+        # the load and the replace
+        with self.lock, open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            keys, fetched = self._load()
+            added = np.fromiter(self.added.keys(), dtype=np.int64,
+                                count=len(self.added))
+            added_fetched = np.fromiter(self.added.values(), dtype=bool,
+                                        count=len(self.added))
+
+            keys = np.concatenate([keys, self.keys, added])
+            fetched = np.concatenate([fetched, self.fetched, added_fetched])
+
+            # a game is fetched if any copy of it says so
+            order = np.lexsort((~fetched, keys))
+            keys, fetched = keys[order], fetched[order]
+            first = np.ones(len(keys), dtype=bool)
+            first[1:] = keys[1:] != keys[:-1]
+            self.keys, self.fetched = keys[first], fetched[first]
+            self.added = {}
+
+            # a temporary file of its own, in the same folder for the rename
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                       prefix=os.path.basename(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, keys=self.keys, fetched=self.fetched)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.remove(tmp)
+                raise
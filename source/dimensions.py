@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class Dimensions:
+    # int32 surrogate key for every account, shared by every run and shard
+    # through sqlite, together with its summoner id, name and region
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                key INTEGER PRIMARY KEY,
+                account_id TEXT UNIQUE NOT NULL,
+                summoner_id TEXT,
+                name TEXT,
+                region TEXT
+            )""")
+        self.db.commit()
+        self.keys = dict(self.db.execute(
+            "SELECT account_id, key FROM accounts").fetchall())
+
+    def encode(self, account_ids) -> np.ndarray:
+        account_ids = pd.Series(account_ids, dtype=object)
+        unique = account_ids.dropna().unique()
+
+        with self.lock:
+            missing = [x for x in unique if x not in self.keys]
+            if len(missing) > 0:
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR IGNORE INTO accounts (account_id) VALUES (?)",
+                        [(x,) for x in missing])
+                # another shard may have inserted some of them first
+                for i in range(0, len(missing), 500):
+                    batch = missing[i:i + 500]
+                    rows = self.db.execute(
+                        f"SELECT account_id, key FROM accounts WHERE account_id IN ({','.join('?' * len(batch))})",
+                        batch)
+                    self.keys.update(rows)
+
+            keys = account_ids.map(self.keys)
+
+        return keys.fillna(-1).to_numpy(dtype=np.int32)
+
+    def update(self, players_info: pd.DataFrame):
+        # players_info still holding the encrypted ids
+        keys = self.encode(players_info["account_id"])
+        rows = zip(players_info["summoner_id"].astype(object), players_info["name"].astype(object),
+                   players_info["region"].astype(object), keys.tolist())
+        with self.lock, self.db:
+            self.db.executemany(
+                "UPDATE accounts SET summoner_id = ?, name = ?, region = ? WHERE key = ?", rows)
+
+    def decode(self, keys) -> pd.DataFrame:
+        keys = [int(x) for x in pd.unique(np.asarray(keys))]
+        rows = []
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows += self.db.execute(
+                    f"SELECT key, account_id, summoner_id, name, region FROM accounts WHERE key IN ({','.join('?' * len(batch))})",
+                    batch).fetchall()
+
+        return pd.DataFrame(rows, columns=["key", "account_id", "summoner_id", "name", "region"])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
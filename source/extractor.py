@@ -0,0 +1,549 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from source.metrics import metrics
+
+
+# (column, timeline field) read from the first 10 minutes deltas
+LANING = [
+    ("xppm_10", "xpPerMinDeltas"),
+    ("cspm_10", "creepsPerMinDeltas"),
+    ("goldpm_10", "goldPerMinDeltas"),
+    ("dmg_takenpm_10", "damageTakenPerMinDeltas"),
+]
+
+# (column, stats field)
+COMBAT = [
+    ("dmg_total", "totalDamageDealtToChampions"),
+    ("healing_total", "totalHeal"),
+    ("units_healed", "totalUnitsHealed"),
+    ("damage_mitigated", "damageSelfMitigated"),
+    ("crowd_control", "totalTimeCrowdControlDealt"),
+    ("dmg_taken", "totalDamageTaken"),
+    ("first_blood", "firstBloodKill"),
+    ("first_blood_assist", "firstBloodAssist"),
+]
+
+FLAIR = [
+    ("killing_sprees", "killingSprees"),
+    ("longest_time_alive", "longestTimeSpentLiving"),
+    ("double_kills", "doubleKills"),
+    ("triple_kills", "tripleKills"),
+    ("quadra_kills", "quadraKills"),
+    ("penta_kills", "pentaKills"),
+]
+
+OBJECTIVES = [
+    ("dmg_to_objectives", "damageDealtToObjectives"),
+    ("dmg_to_turrets", "damageDealtToTurrets"),
+    ("total_cs", "totalMinionsKilled"),
+    ("jungle_cs", "neutralMinionsKilled"),
+    ("jungle_invaded", "neutralMinionsKilledEnemyJungle"),
+    ("wards_placed", "wardsPlaced"),
+    ("wards_killed", "wardsKilled"),
+]
+
+# stats tables in the order they were filled in, a participant
+# only shows up in a table if every previous one could be filled too
+STATS_TABLES = {
+    "player_laning_stats": LANING,
+    "player_combat_stats": COMBAT,
+    "player_flair_stats": FLAIR,
+    "player_objective_stats": OBJECTIVES,
+}
+
+STATS_KEYS = ["match_id", "account_id", "region", "champion", "lane"]
+
+# every stats column of the wide player_match_stats table
+STATS_COLUMNS = [column for fields in STATS_TABLES.values()
+                 for column, _ in fields]
+
+# compact dtype of every numeric column
+DTYPES = {
+    "match_id": np.int64,
+    "match_duration": np.int32,
+    "champion": np.int16,
+    "pick_turn": np.int8,
+    "won": np.int8,
+    "participant": np.int8,
+    "stats_level": np.int8,
+    "xppm_10": np.float32,
+    "cspm_10": np.float32,
+    "goldpm_10": np.float32,
+    "dmg_takenpm_10": np.float32,
+    "dmg_total": np.int32,
+    "healing_total": np.int32,
+    "units_healed": np.int16,
+    "damage_mitigated": np.int32,
+    "crowd_control": np.int32,
+    "dmg_taken": np.int32,
+    "first_blood": np.int8,
+    "first_blood_assist": np.int8,
+    "killing_sprees": np.int16,
+    "longest_time_alive": np.int16,
+    "double_kills": np.int16,
+    "triple_kills": np.int16,
+    "quadra_kills": np.int16,
+    "penta_kills": np.int16,
+    "dmg_to_objectives": np.int32,
+    "dmg_to_turrets": np.int32,
+    "total_cs": np.int16,
+    "jungle_cs": np.int16,
+    "jungle_invaded": np.int16,
+    "wards_placed": np.int16,
+    "wards_killed": np.int16,
+}
+
+# dtype of the block holding each stats table while extracting
+BLOCK_DTYPES = {
+    "player_laning_stats": np.float32,
+    "player_combat_stats": np.int32,
+    "player_flair_stats": np.int16,
+    "player_objective_stats": np.int32,
+}
+
+LANES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "SUPPORT"]
+
+# low cardinality strings, dictionary encoded while extracting
+CATEGORIES = ["region", "lane", "patch", "winner"]
+
+TABLES = ["match_info", "champion_bans", "champion_picks",
+          "players_lanes", "players_champions", "players_info",
+          "player_match_stats", *STATS_TABLES]
+
+
+def patch_key(patch: str) -> tuple:
+    # "10.9" < "10.12" once compared as numbers
+    return tuple(int(x) for x in patch.split(".") if x.isdigit())
+
+
+def stats_view(player_match_stats: pd.DataFrame, table: str) -> pd.DataFrame:
+    # one of the four stats tables cut out of the wide table, e.g.
+    # stats_view(frame, "player_combat_stats")
+    level = list(STATS_TABLES).index(table) + 1
+    columns = [column for column, _ in STATS_TABLES[table]]
+    rows = player_match_stats["stats_level"].to_numpy() >= level
+
+    return player_match_stats.loc[rows, [*STATS_KEYS, *columns, "won"]].reset_index(drop=True)
+
+
+class _Buffer:
+    # preallocated typed columns, doubled in size when full
+
+    def __init__(self, columns: dict, capacity: int):
+        self.n = 0
+        self.capacity = max(capacity, 1)
+        self.columns = {}
+        for name, dtype in columns.items():
+            shape = dtype[1] if isinstance(dtype, tuple) else None
+            dtype = dtype[0] if isinstance(dtype, tuple) else dtype
+            self.columns[name] = np.empty(
+                (self.capacity, shape) if shape else self.capacity, dtype=dtype)
+
+    def reserve(self, rows: int):
+        if self.n + rows <= self.capacity:
+            return
+        while self.n + rows > self.capacity:
+            self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty((self.capacity, *column.shape[1:]),
+                             dtype=column.dtype)
+            grown[:self.n] = column[:self.n]
+            self.columns[name] = grown
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.n]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class _Dictionary:
+    # code of every distinct value, in order of appearance
+
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        return self.codes.setdefault(value, len(self.codes))
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=list(self.codes))
+
+
+class MatchExtractor:
+    # walks every match once and fills the columns of all the tables at the same time
+
+    def __init__(self, capacity=1000):
+        self.dictionaries = {column: _Dictionary() for column in CATEGORIES}
+
+        self.matches = _Buffer({
+            "match_id": np.int64,
+            "region": np.int8,
+            "date_created": np.int64,
+            "match_duration": np.int32,
+            "patch": np.int16,
+            "winner": np.int8,
+        }, capacity)
+
+        self.bans = _Buffer({
+            "champion": np.int16,
+            "match_id": np.int64,
+            "pick_turn": np.int8,
+        }, capacity * 10)
+
+        # each stats table is a block of columns filled one row at a time
+        participant_columns = {
+            "match_id": np.int64,
+            "match_region": np.int8,
+            "participant": np.int8,
+            "account_id": object,
+            "summoner_id": object,
+            "region": np.int8,
+            "name": object,
+            "champion": np.int16,
+            "lane": np.int8,
+            "won": np.int8,
+            "opponent": (np.int16, 5),
+            "identified": bool,
+            "picked": bool,
+            "stats_level": np.int8,
+        }
+        for table, fields in STATS_TABLES.items():
+            participant_columns[table] = (BLOCK_DTYPES[table], len(fields))
+        self.participants = _Buffer(participant_columns, capacity * 10)
+
+    def __len__(self) -> int:
+        return self.matches.n
+
+    def add(self, match: dict):
+        with metrics.section("extract", items=1):
+            self._add_match(match)
+            self._add_bans(match)
+            self._add_participants(match)
+
+    @property
+    def nbytes(self) -> int:
+        # memory held by the column buffers
+        return self.matches.nbytes + self.bans.nbytes + self.participants.nbytes
+
+    def _add_match(self, match: dict):
+        self.matches.reserve(1)
+        columns = self.matches.columns
+        row = self.matches.n
+
+        columns["match_id"][row] = match["gameId"]
+        columns["region"][row] = self.dictionaries["region"].code(
+            match["platformId"])
+        columns["date_created"][row] = match["gameCreation"]
+        columns["match_duration"][row] = match["gameDuration"]
+
+        # keep major and minor version e.g. 10.12 or 10.9
+        columns["patch"][row] = self.dictionaries["patch"].code(
+            ".".join(match["gameVersion"].split(".")[:2]))
+
+        # winners
+        winner = None
+        for team in match["teams"]:
+            if team["win"] == "Win":
+                winner = "Blue" if team["teamId"] == 100 else "Red"
+                break
+        columns["winner"][row] = self.dictionaries["winner"].code(winner)
+
+        self.matches.n += 1
+
+    def _add_bans(self, match: dict):
+        # the ban slot tells apart the skipped bans (-1) and a champion
+        # banned by both teams, the position in the match when missing
+        turn = 0
+        for team in match["teams"]:
+            self.bans.reserve(len(team["bans"]))
+            columns = self.bans.columns
+            for ban in team["bans"]:
+                turn += 1
+                try:
+                    columns["champion"][self.bans.n] = ban["championId"]
+                except (KeyError, TypeError):
+                    continue
+                columns["match_id"][self.bans.n] = match["gameId"]
+                columns["pick_turn"][self.bans.n] = ban.get("pickTurn", turn)
+                self.bans.n += 1
+
+    def _add_participants(self, match: dict):
+        participants = match["participants"]
+        identities = match["participantIdentities"]
+        self.participants.reserve(len(participants))
+        columns = self.participants.columns
+        regions = self.dictionaries["region"]
+        lanes = self.dictionaries["lane"]
+        laning, combat, flair, objectives = (
+            columns[table] for table in STATS_TABLES)
+
+        match_region = regions.code(match["platformId"])
+        opponents = [[enemy.get("championId", -1) for enemy in team[:5]] + [-1] * (5 - len(team[:5]))
+                     for team in (participants[5:], participants[:5])]
+
+        for i, participant in enumerate(participants):
+            row = self.participants.n + i
+            columns["match_id"][row] = match["gameId"]
+            columns["match_region"][row] = match_region
+            columns["participant"][row] = participant.get("participantId", i + 1)
+
+            # the five champions of the other team
+            columns["opponent"][row] = opponents[0 if i < 5 else 1]
+
+            # account info, stats only need the account and region
+            accounted = identified = False
+            try:
+                player = identities[i]["player"]
+                columns["account_id"][row] = player["accountId"]
+                columns["region"][row] = regions.code(
+                    player["currentPlatformId"])
+                accounted = True
+                columns["summoner_id"][row] = player["summonerId"]
+                columns["name"][row] = player["summonerName"]
+                identified = True
+            except (KeyError, IndexError, TypeError):
+                pass
+            columns["identified"][row] = identified
+
+            # champion, lane and result
+            try:
+                timeline = participant["timeline"]
+                stats = participant["stats"]
+                columns["champion"][row] = participant["championId"]
+                columns["won"][row] = 1 if stats["win"] == True else 0
+                role = timeline["role"]
+                if role == "DUO_SUPPORT":
+                    lane = "SUPPORT"
+                elif role == "DUO":
+                    lane = "MIDDLE"
+                else:
+                    lane = timeline["lane"]
+                columns["lane"][row] = lanes.code(lane)
+                picked = True
+            except (KeyError, TypeError):
+                picked = False
+            columns["picked"][row] = picked
+
+            # in game stats
+            level = 0
+            if accounted and picked:
+                try:
+                    laning[row] = [timeline[field]["0-10"]
+                                   for _, field in LANING]
+                    level += 1
+                    combat[row] = [stats[field] for _, field in COMBAT]
+                    level += 1
+                    flair[row] = [stats[field] for _, field in FLAIR]
+                    level += 1
+                    objectives[row] = [stats[field]
+                                       for _, field in OBJECTIVES]
+                    level += 1
+                except (KeyError, TypeError, ValueError, OverflowError):
+                    pass
+            columns["stats_level"][row] = level
+
+        self.participants.n += len(participants)
+
+    def tables(self, dimensions=None) -> dict:
+        # with dimensions every account_id becomes its int32 surrogate key
+        frames = {}
+
+        # basic match info
+        match_info = pd.DataFrame({
+            "match_id": self.matches["match_id"],
+            "region": self._categorical("region", self.matches["region"]),
+            "date_created": pd.to_datetime(self.matches["date_created"], unit="ms").to_period("D"),
+            "match_duration": self.matches["match_duration"],
+            "patch": self._categorical("patch", self.matches["patch"]),
+            "winner": self._categorical("winner", self.matches["winner"]),
+        })
+        frames["match_info"] = match_info
+
+        frames["champion_bans"] = pd.DataFrame({
+            "champion": self.bans["champion"],
+            "match_id": self.bans["match_id"],
+            "pick_turn": self.bans["pick_turn"],
+            "banned": np.ones(self.bans.n, dtype=np.int8),
+        })
+
+        players = self.participants
+        account_ids = players["account_id"]
+        if dimensions is not None:
+            account_ids = dimensions.encode(account_ids)
+
+        # picks, the opponents faced are counted in matchups()
+        rows = np.flatnonzero(players["picked"])
+        won = players["won"][rows]
+        frames["champion_picks"] = pd.DataFrame({
+            "champion": players["champion"][rows],
+            "match_id": players["match_id"][rows],
+            "region": self._categorical("region", players["match_region"][rows]),
+            "picked": np.ones(len(rows), dtype=np.int8),
+            "lane": self._categorical("lane", players["lane"][rows]),
+            "won": won,
+            "lost": 1 - won,
+        })
+
+        # players info
+        rows = np.flatnonzero(players["identified"] & players["picked"])
+        frames["players_lanes"] = pd.DataFrame({
+            "account_id": account_ids[rows],
+            "lane": self._categorical("lane", players["lane"][rows]),
+            "won": players["won"][rows],
+        })
+        frames["players_champions"] = pd.DataFrame({
+            "account_id": account_ids[rows],
+            "champion": players["champion"][rows],
+            "won": players["won"][rows],
+        })
+        frames["players_info"] = pd.DataFrame({
+            "account_id": players["account_id"][rows],
+            "summoner_id": players["summoner_id"][rows],
+            "region": self._categorical("region", players["region"][rows]),
+            "name": players["name"][rows],
+        }).drop_duplicates()
+        if dimensions is not None:
+            dimensions.update(frames["players_info"])
+            frames["players_info"]["account_id"] = dimensions.encode(
+                frames["players_info"]["account_id"])
+
+        # in game stats, one wide row per participant with at least the
+        # laning stats, the tables it couldn't reach are left at 0
+        rows = np.flatnonzero(players["stats_level"] >= 1)
+        levels = players["stats_level"][rows]
+        data = {
+            "match_id": players["match_id"][rows],
+            "participant": players["participant"][rows],
+            "account_id": account_ids[rows],
+            "region": self._categorical("region", players["region"][rows]),
+            "champion": players["champion"][rows],
+            "lane": self._categorical("lane", players["lane"][rows]),
+        }
+        for level, (table, fields) in enumerate(STATS_TABLES.items(), start=1):
+            block = players[table][rows]
+            block[levels < level] = 0
+            for j, (column, _) in enumerate(fields):
+                data[column] = block[:, j].astype(DTYPES[column])
+        data["won"] = players["won"][rows]
+        data["stats_level"] = levels
+
+        # sorted on account and lane so a player's games are contiguous
+        frames["player_match_stats"] = pd.DataFrame(data).sort_values(
+            ["account_id", "lane"], kind="stable", ignore_index=True)
+        for table in STATS_TABLES:
+            frames[table] = stats_view(frames["player_match_stats"], table)
+
+        return frames
+
+    def matchups(self):
+        # champion vs champion games and wins of every pick, see source.matchups
+        from source.matchups import Matchups
+
+        players = self.participants
+        rows = np.flatnonzero(players["picked"])
+        lanes = pd.Categorical(self._categorical("lane", players["lane"][rows]),
+                               categories=LANES).codes
+
+        matchups = Matchups()
+        matchups.add(lanes, players["champion"][rows],
+                     players["opponent"][rows], players["won"][rows])
+        return matchups
+
+    def meta(self):
+        # picks, bans, wins and games per patch, region, lane and champion,
+        # see source.meta
+        from source.meta import MetaCube
+
+        # position of the match of every pick and ban
+        match_ids = self.matches["match_id"]
+        order = np.argsort(match_ids, kind="stable")
+        patches = self._categorical("patch", self.matches["patch"])
+        regions = self._categorical("region", self.matches["region"])
+
+        def match_rows(ids):
+            return order[np.searchsorted(match_ids, ids, sorter=order)]
+
+        cube = MetaCube()
+        cube.add_games(patches, regions)
+
+        players = self.participants
+        rows = np.flatnonzero(players["picked"])
+        matches = match_rows(players["match_id"][rows])
+        lanes = pd.Categorical(self._categorical("lane", players["lane"][rows]),
+                               categories=LANES).codes
+        cube.add_picks(patches[matches], regions[matches], lanes,
+                       players["champion"][rows], players["won"][rows])
+
+        matches = match_rows(self.bans["match_id"])
+        cube.add_bans(patches[matches], regions[matches], self.bans["champion"])
+        return cube
+
+    def match_regions(self) -> np.ndarray:
+        # platform of every match, the column itself holds dictionary codes
+        return np.asarray(self._categorical("region", self.matches["region"]))
+
+    def _categorical(self, column: str, codes: np.ndarray) -> pd.Categorical:
+        return self.dictionaries[column].categorical(codes)
+
+    def save(self, path: str, start: int, end: int, tables=TABLES, output="pickle", dimensions=None):
+        metrics.gauge("extractor_buffer_bytes", self.nbytes)
+        with metrics.section("save", items=len(self)):
+            self._save(path, start, end, tables, output, dimensions)
+
+    def _save(self, path: str, start: int, end: int, tables: list, output: str, dimensions):
+        frames = self.tables(dimensions)
+
+        # partitioned parquet dataset, see source.dataset
+        if output == "dataset":
+            import source.dataset as dataset
+            os.makedirs(f"{path}/matchups", exist_ok=True)
+            self.matchups().save(f"{path}/matchups/{start}-{end}.npz")
+            os.makedirs(f"{path}/meta", exist_ok=True)
+            self.meta().save(f"{path}/meta/{start}-{end}.npz")
+            dataset.write_chunk({table: frames[table] for table in tables},
+                                path, f"{start}-{end}")
+            return
+
+        self.matchups().save(f"{path}/matchups_{start}-{end}.npz")
+        self.meta().save(f"{path}/meta_{start}-{end}.npz")
+
+        # write then rename, a crash never leaves half a file behind
+        for table in tables:
+            file = f"{path}/{table}_{start}-{end}.pkl"
+            frames[table].to_pickle(f"{file}.tmp", protocol=4)
+            os.replace(f"{file}.tmp", file)
+
+    def saved(self, path: str, start: int, end: int, output="pickle") -> bool:
+        if output == "dataset":
+            import source.dataset as dataset
+            return dataset.chunk_saved(path, f"{start}-{end}")
+
+        # the last table is written last, if it's there the chunk is complete
+        return os.path.exists(f"{path}/{TABLES[-1]}_{start}-{end}.pkl")
+
+
+def saved_end(path: str, output="pickle") -> int:
+    # end of the last chunk saved in path, chunks of a new run are
+    # numbered from there so they never replace those of an earlier run
+    if output == "dataset":
+        names = [os.path.basename(x) for x in glob.glob(f"{path}/_chunks/*-*")]
+    else:
+        names = [os.path.basename(x)[len(TABLES[-1]) + 1:-len(".pkl")]
+                 for x in glob.glob(f"{path}/{TABLES[-1]}_*-*.pkl")]
+    return max((int(name.split("-")[-1]) for name in names), default=0)
+
+
+def extract(raw_matches: list) -> MatchExtractor:
+    extractor = MatchExtractor(capacity=len(raw_matches))
+    for match in raw_matches:
+        extractor.add(match)
+
+    return extractor
@@ -0,0 +1,72 @@
+import json
+
+from source.extractor import LANING, COMBAT, FLAIR, OBJECTIVES
+from source.metrics import metrics
+
+# orjson is optional, it decodes several times faster than json
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+# the only fields of a match-v4 payload read by the extractor
+MATCH_FIELDS = ["gameId", "platformId", "gameCreation", "gameDuration", "gameVersion"]
+PLAYER_FIELDS = ["accountId", "currentPlatformId", "summonerId", "summonerName"]
+STATS_FIELDS = ["win", *(field for _, field in COMBAT + FLAIR + OBJECTIVES)]
+DELTAS_FIELDS = [field for _, field in LANING]
+
+
+def _pick(data, fields: list) -> dict:
+    if not isinstance(data, dict):
+        return data
+    return {field: data[field] for field in fields if field in data}
+
+
+def _project_timeline(timeline) -> dict:
+    if not isinstance(timeline, dict):
+        return timeline
+    projected = _pick(timeline, ["role", "lane"])
+    for field in DELTAS_FIELDS:
+        if isinstance(timeline.get(field), dict) and "0-10" in timeline[field]:
+            projected[field] = {"0-10": timeline[field]["0-10"]}
+    return projected
+
+
+def _project_participant(participant: dict) -> dict:
+    projected = _pick(participant, ["participantId", "championId"])
+    if "timeline" in participant:
+        projected["timeline"] = _project_timeline(participant["timeline"])
+    if "stats" in participant:
+        projected["stats"] = _pick(participant["stats"], STATS_FIELDS)
+    return projected
+
+
+def project_match(match: dict) -> dict:
+    # a compact copy of the match, missing fields stay missing so the
+    # extractor handles them exactly as in the full payload
+    projected = _pick(match, MATCH_FIELDS)
+    projected["teams"] = [
+        {"teamId": team.get("teamId"), "win": team.get("win"),
+         "bans": [_pick(ban, ["championId", "pickTurn"]) for ban in team.get("bans", [])]}
+        for team in match.get("teams", [])]
+    projected["participants"] = [_project_participant(participant)
+                                 for participant in match.get("participants", [])]
+    projected["participantIdentities"] = [
+        {"player": _pick(identity["player"], PLAYER_FIELDS)} if "player" in identity else {}
+        for identity in match.get("participantIdentities", [])]
+
+    return projected
+
+
+def decode_match(payload: bytes) -> dict:
+    # decoded once and projected right away, the full payload is never kept
+    with metrics.section("decode", items=1):
+        return project_match(loads(payload))
+
+
+def decode_match_list(payload: bytes) -> dict:
+    page = loads(payload)
+    return {"matches": [{"gameId": match["gameId"], "timestamp": match["timestamp"]}
+                        for match in page.get("matches", [])]}
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import subprocess
+from datetime import datetime, timedelta
+
+# nothing heavy is imported here, every stage imports what it uses so
+# starting a job or a shard costs only the modules of its stages
+
+
+DEFAULTS = {
+    "path": "raw_data/job",
+    "stages": [],
+    "region": None,
+    "regions": None,
+    "start": 0,
+    "end": None,
+    "shards": 1,
+    "days_ago": 30,
+    "output": "pickle",
+    "chunk_size": 1000,
+    "workers": 4,
+    "folds": 1,
+    # the matches stage extracts downloaded games again from the cache
+    "reprocess": False,
+    # set by run, chunks of the matches stage are numbered from here
+    "first_chunk": 0,
+}
+
+
+def load_spec(file=None, **overrides) -> dict:
+    # defaults < json file < overrides given on the command line
+    spec = dict(DEFAULTS)
+    if file is not None:
+        with open(file) as f:
+            spec.update(json.load(f))
+    spec.update({key: value for key, value in overrides.items() if value is not None})
+    return spec
+
+
+def _region(spec: dict) -> str:
+    from source.settings import REGION
+    return spec["region"] or REGION
+
+
+def _begin_time(spec: dict) -> int:
+    # start of the day, so a rerun on the same day resumes the same journals
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return round(time.mktime((today - timedelta(days=spec["days_ago"])).timetuple()) * 1000)
+
+
+def _shard_path(spec: dict, stage: str, shard: int) -> str:
+    path = f"{spec['path']}/shards/{stage}/{shard}"
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def shard_range(spec: dict, size: int, shard: int, shards: int) -> tuple:
+    # the disjoint part of [start, end) worked on by one shard
+    start = spec["start"]
+    end = min(spec["end"] if spec["end"] is not None else size, size)
+    step = -(-(end - start) // shards)
+    return min(start + shard * step, end), min(start + (shard + 1) * step, end)
+
+
+def entries(spec: dict):
+    import source.players as players
+    from source.settings import TOKEN
+    players.get_entries(spec["path"], TOKEN, region=_region(spec))
+
+
+def accounts(spec: dict, shard=0, shards=1):
+    import pandas as pd
+    import source.players as players
+    from source.journal import Journal
+    from source.settings import TOKEN
+
+    ids = pd.read_pickle(f"{spec['path']}/players_pool.pkl")["summonerId"].to_list()
+    start, end = shard_range(spec, len(ids), shard, shards)
+    path = _shard_path(spec, "accounts", shard)
+    players.get_account_info(ids, TOKEN, path, start, end,
+                             journal=Journal(f"{path}/journal.sqlite", "account_info"),
+                             region=_region(spec))
+
+
+def merge_accounts(spec: dict):
+    import pandas as pd
+    import source.players as players
+
+    account_info = pd.concat([pd.read_pickle(f"{spec['path']}/shards/accounts/{shard}/account_info.pkl")
+                              for shard in range(spec["shards"])], ignore_index=True)
+    account_info.to_pickle(f"{spec['path']}/account_info.pkl", protocol=4)
+    players.merge_with(pd.read_pickle(f"{spec['path']}/players_pool.pkl"),
+                       account_info, spec["path"])
+
+
+def match_history(spec: dict, shard=0, shards=1):
+    import pandas as pd
+    import source.players as players
+    from source.cache import ResponseCache
+    from source.dedup import GameIndex
+    from source.journal import Journal
+    from source.settings import TOKEN, CACHE_PATH, INDEX_PATH
+
+    ids = pd.read_pickle(f"{spec['path']}/players_pool_account.pkl")["accountId"].to_list()
+    start, end = shard_range(spec, len(ids), shard, shards)
+    path = _shard_path(spec, "match_history", shard)
+    begin_time = _begin_time(spec)
+    players.get_match_history(ids, TOKEN, path, start, end, begin_time=begin_time,
+                              cache=ResponseCache(CACHE_PATH),
+                              journal=Journal(f"{path}/journal.sqlite", f"match_history_{begin_time}"),
+                              index=GameIndex(INDEX_PATH), region=_region(spec))
+
+
+def merge_match_history(spec: dict):
+    import pandas as pd
+
+    match_ids = pd.concat([pd.read_pickle(f"{spec['path']}/shards/match_history/{shard}/match_ids.pkl")
+                           for shard in range(spec["shards"])], ignore_index=True)
+    match_ids = match_ids.drop_duplicates(subset="gameId", ignore_index=True)
+    match_ids.to_pickle(f"{spec['path']}/match_ids.pkl", protocol=4)
+    print(f"File saved at {spec['path']}/match_ids.pkl, games: {len(match_ids)}")
+
+
+def matches(spec: dict, shard=0, shards=1):
+    # chunks are named after their range moved past the chunks of earlier
+    # runs, shards share the folder
+    import pandas as pd
+    import source.matches as matches
+    from source.cache import ResponseCache
+    from source.dedup import GameIndex
+    from source.dimensions import Dimensions
+    from source.settings import TOKEN, CACHE_PATH, INDEX_PATH, DIMENSIONS_PATH
+
+    ids = pd.read_pickle(f"{spec['path']}/match_ids.pkl")["gameId"].to_list()
+    start, end = shard_range(spec, len(ids), shard, shards)
+    path = f"{spec['path']}/matches"
+    os.makedirs(path, exist_ok=True)
+    matches.get_matches(ids, path, TOKEN, start, end, cache=ResponseCache(CACHE_PATH),
+                        stream=True, chunk_size=spec["chunk_size"], index=GameIndex(INDEX_PATH),
+                        output=spec["output"], dimensions=Dimensions(DIMENSIONS_PATH),
+                        region=_region(spec), offset=spec["first_chunk"],
+                        reprocess=spec["reprocess"])
+
+
+def crawl(spec: dict):
+    # the whole pipeline in one process, one thread pool per region
+    import source.crawler as crawler
+    from source.cache import ResponseCache
+    from source.dedup import GameIndex
+    from source.dimensions import Dimensions
+    from source.settings import TOKEN, REGIONS, CACHE_PATH, INDEX_PATH, DIMENSIONS_PATH
+
+    path = f"{spec['path']}/matches"
+    os.makedirs(path, exist_ok=True)
+    crawler.crawl_regions(path, TOKEN, spec["regions"] or REGIONS,
+                          begin_time=_begin_time(spec), workers=spec["workers"],
+                          chunk_size=spec["chunk_size"], cache=ResponseCache(CACHE_PATH),
+                          index=GameIndex(INDEX_PATH), output=spec["output"],
+                          dimensions=Dimensions(DIMENSIONS_PATH))
+
+
+def merge(spec: dict):
+    import source.merge as merge
+    import source.matchups as matchups
+    import source.meta as meta
+
+    path = f"{spec['path']}/matches"
+    output_path = f"{spec['path']}/merged"
+    os.makedirs(output_path, exist_ok=True)
+    merged = merge.merge_files(path, output_path)
+    merge.merge_stats(merged, output_path)
+    matchups.merge_files(path, output_path)
+    meta.merge_files(path, output_path)
+
+
+def aggregates(spec: dict):
+    from source.aggregates import AggregateStore
+    from source.merge import shard_paths
+    from source.settings import AGGREGATES_PATH
+
+    store = AggregateStore(AGGREGATES_PATH)
+    for path in shard_paths(f"{spec['path']}/matches"):
+        store.update_from_chunks(path)
+    store.save()
+
+
+def models(spec: dict):
+    import source.training as training
+    from source.merge import shard_paths
+    from source.settings import MODELS_PATH
+
+    lane_models = training.LaneModels(MODELS_PATH)
+    for path in shard_paths(f"{spec['path']}/matches"):
+        lane_models.update_from_chunks(path)
+    lane_models.save()
+    lane_models.lane_features().to_pickle(f"{spec['path']}/lane_features.pkl", protocol=4)
+
+
+def train(spec: dict):
+    import source.training as training
+
+    training.train_models(f"{spec['path']}/merged", f"{spec['path']}/features",
+                          spec["path"], folds=spec["folds"], workers=spec["workers"])
+
+
+def database(spec: dict):
+    from source.database import Database
+
+    db = Database()
+    db.load_chunks(f"{spec['path']}/matches")
+    db.close()
+
+
+def reports(spec: dict):
+    import source.reports as reports
+    import source.training as training
+    from source.aggregates import AggregateStore
+    from source.dimensions import Dimensions
+    from source.settings import AGGREGATES_PATH, MODELS_PATH, DIMENSIONS_PATH
+
+    features = None
+    if os.path.exists(MODELS_PATH):
+        features = training.LaneModels(MODELS_PATH).lane_features().iloc[0].to_dict()
+    reports.generate(AggregateStore(AGGREGATES_PATH), f"{spec['path']}/reports",
+                     features=features, workers=spec["workers"],
+                     dimensions=Dimensions(DIMENSIONS_PATH))
+
+
+# stage name -> (function, merge run once every shard is done), stages
+# with a merge take disjoint ranges of their input ids
+STAGES = {
+    "entries": (entries, None),
+    "accounts": (accounts, merge_accounts),
+    "match_history": (match_history, merge_match_history),
+    "matches": (matches, None),
+    "crawl": (crawl, None),
+    "merge": (merge, None),
+    "aggregates": (aggregates, None),
+    "models": (models, None),
+    "train": (train, None),
+    "database": (database, None),
+    "reports": (reports, None),
+}
+
+SHARDED = ["accounts", "match_history", "matches"]
+
+# stages reading the chunk pickles, they find nothing in a dataset
+PICKLE_ONLY = ["merge", "aggregates", "models", "database"]
+
+
+def validate(spec: dict):
+    for stage in spec["stages"]:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage}, one of {', '.join(STAGES)}")
+
+    if spec["output"] not in ["pickle", "dataset"]:
+        raise ValueError(f"Unknown output {spec['output']}, pickle or dataset")
+    if spec["output"] == "dataset":
+        stages = [stage for stage in spec["stages"] if stage in PICKLE_ONLY]
+        if stages:
+            raise ValueError(f"Stages {', '.join(stages)} read chunk pickles, "
+                             f"run them with output pickle or read the dataset "
+                             f"with source.dataset.read_table")
+
+
+def _dump_metrics(spec: dict, name: str):
+    # only once something was measured, the registry is never imported otherwise
+    if "source.metrics" in sys.modules:
+        sys.modules["source.metrics"].metrics.dump(f"{spec['path']}/metrics/{name}")
+
+
+def run_shard(spec: dict, stage: str, shard: int, shards: int):
+    STAGES[stage][0](spec, shard, shards)
+    _dump_metrics(spec, f"{stage}_{shard}")
+
+
+def _save_spec(spec: dict):
+    # the spec every shard process is started from
+    os.makedirs(spec["path"], exist_ok=True)
+    with open(f"{spec['path']}/job.json", "w") as f:
+        json.dump(spec, f, indent=2)
+
+
+def launch(spec: dict, stage: str, runner: str):
+    # one process per shard of the stage, each started from the saved
+    # spec so it could as well run on another machine
+    shards = spec["shards"]
+    spec_file = f"{spec['path']}/job.json"
+    processes = [subprocess.Popen([sys.executable, runner, spec_file, "--stage", stage,
+                                   "--shard", f"{shard}/{shards}"])
+                 for shard in range(shards)]
+    failed = [shard for shard, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Shards {failed} of {stage} failed")
+
+
+def run(spec: dict, runner: str):
+    # every stage of the job in order, sharded stages on spec["shards"]
+    # processes of runner, the script that calls this
+    validate(spec)
+    _save_spec(spec)
+
+    for stage in spec["stages"]:
+        began = time.perf_counter()
+        print(f"Stage {stage}")
+        func, merge_shards = STAGES[stage]
+
+        # a rerun with a new match_ids.pkl must not take the names of the
+        # chunks already saved, every shard reads the same first chunk
+        if stage == "matches":
+            from source.extractor import saved_end
+            spec["first_chunk"] = saved_end(f"{spec['path']}/matches", spec["output"])
+            _save_spec(spec)
+
+        if stage in SHARDED and spec["shards"] > 1:
+            launch(spec, stage, runner)
+        else:
+            func(spec)
+
+        if merge_shards is not None:
+            merge_shards(spec)
+        print(f"Stage {stage} done in {time.perf_counter() - began:.1f}s")
+
+    _dump_metrics(spec, "job")
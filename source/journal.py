@@ -0,0 +1,110 @@
+import re
+import json
+import sqlite3
+import threading
+
+
+class Journal:
+    # ids already worked on and their results, kept in sqlite so a
+    # restarted run can skip them and nothing is requested twice
+
+    def __init__(self, path: str, stage: str):
+        self.lock = threading.Lock()
+        self.table = re.sub(r"\W", "_", stage)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{self.table}" (
+                id TEXT PRIMARY KEY,
+                result TEXT NOT NULL
+            )""")
+        self.db.commit()
+
+    def completed(self) -> set:
+        with self.lock:
+            rows = self.db.execute(f'SELECT id FROM "{self.table}"')
+            return {row[0] for row in rows}
+
+    def record(self, id: str, result):
+        with self.lock:
+            self.db.execute(
+                f'INSERT OR REPLACE INTO "{self.table}" VALUES (?, ?)', (id, json.dumps(result)))
+            self.db.commit()
+
+    def results(self, ids=None) -> list:
+        # results in the order of ids, ids never completed are left out
+        with self.lock:
+            rows = dict(self.db.execute(
+                f'SELECT id, result FROM "{self.table}"').fetchall())
+
+        if ids is None:
+            ids = rows.keys()
+
+        return [json.loads(rows[id]) for id in ids if id in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class RefreshState:
+    # next beginTime for each account and every game id already queued
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                account_id TEXT PRIMARY KEY,
+                begin_time INTEGER NOT NULL
+            )""")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS games (
+                game_id INTEGER PRIMARY KEY,
+                timestamp INTEGER NOT NULL,
+                pending INTEGER NOT NULL DEFAULT 1
+            )""")
+        self.db.commit()
+
+    def watermark(self, account_id: str, default: int) -> int:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT begin_time FROM watermarks WHERE account_id = ?", (account_id,)).fetchone()
+        return row[0] if row is not None else default
+
+    def advance(self, account_id: str, matches: list) -> int:
+        # queue the unseen games and move the watermark past the newest one,
+        # both in the same transaction
+        if len(matches) == 0:
+            return 0
+
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO games (game_id, timestamp) VALUES (?, ?)",
+                [(match["gameId"], match["timestamp"]) for match in matches])
+            unseen = self.db.total_changes - before
+            self.db.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                (account_id, max(match["timestamp"] for match in matches) + 1))
+
+        return unseen
+
+    def pending(self) -> list:
+        with self.lock:
+            return self.db.execute(
+                "SELECT game_id, timestamp FROM games WHERE pending = 1 ORDER BY timestamp").fetchall()
+
+    def clear_pending(self, game_ids: list):
+        # only games confirmed downloaded, the others are handed out again
+        with self.lock, self.db:
+            self.db.executemany("UPDATE games SET pending = 0 WHERE game_id = ?",
+                                [(int(game_id),) for game_id in game_ids])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,110 @@
+import time
+import threading
+
+from collections import deque
+
+
+# parse a riot limit header e.g. "20:1,100:120" into [(20, 1), (100, 120)]
+def parse_limits(header: str) -> list:
+    limits = []
+    for pair in header.split(","):
+        value, window = pair.split(":")
+        limits.append((int(value), int(window)))
+
+    return limits
+
+
+class Bucket:
+    # keeps the time of every request made inside the window
+
+    def __init__(self, limit: int, window: int, margin=0.02):
+        self.limit = limit
+        self.window = window * (1 + margin)
+        self.stamps = deque()
+
+    def _expire(self, now: float):
+        while len(self.stamps) > 0 and self.stamps[0] <= now - self.window:
+            self.stamps.popleft()
+
+    def wait(self, now: float) -> float:
+        self._expire(now)
+        if len(self.stamps) < self.limit:
+            return 0
+        return self.stamps[len(self.stamps) - self.limit] + self.window - now
+
+    def add(self, now: float):
+        self.stamps.append(now)
+
+    def sync(self, count: int, now: float):
+        # the server counted requests we don't know about
+        self._expire(now)
+        while len(self.stamps) < count:
+            self.stamps.append(now)
+
+
+class RateLimiter:
+    # application buckets are shared by every endpoint,
+    # method buckets are kept per endpoint
+
+    def __init__(self, app_limits="20:1,100:120"):
+        self.lock = threading.Lock()
+        self.app = [Bucket(limit, window)
+                    for limit, window in parse_limits(app_limits)]
+        self.methods = {}
+        self.blocked_until = {None: 0}
+        self.throttled = 0.0
+
+    def acquire(self, method: str) -> float:
+        # block until every bucket has room, then take a slot on each,
+        # returns the seconds spent waiting
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                buckets = self.app + self.methods.get(method, [])
+                wait = max([self.blocked_until[None] - now,
+                            self.blocked_until.get(method, 0) - now]
+                           + [bucket.wait(now) for bucket in buckets])
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.add(now)
+                    return waited
+                self.throttled += wait
+            time.sleep(wait)
+            waited += wait
+
+    def update(self, method: str, headers: dict):
+        # align our buckets with the limits and counts reported by riot
+        with self.lock:
+            now = time.monotonic()
+            if "X-App-Rate-Limit" in headers:
+                self.app = self._reconcile(
+                    self.app, headers["X-App-Rate-Limit"], headers.get("X-App-Rate-Limit-Count"), now)
+            if "X-Method-Rate-Limit" in headers:
+                self.methods[method] = self._reconcile(
+                    self.methods.get(method, []), headers["X-Method-Rate-Limit"], headers.get("X-Method-Rate-Limit-Count"), now)
+
+    def block(self, seconds: float, method=None):
+        # nobody (or nobody on this endpoint) makes a request for a while
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.blocked_until[method] = max(
+                self.blocked_until.get(method, 0), until)
+
+    @staticmethod
+    def _reconcile(buckets: list, limits: str, counts: str, now: float) -> list:
+        by_window = {bucket.window: bucket for bucket in buckets}
+        reconciled = {}
+
+        for limit, window in parse_limits(limits):
+            bucket = Bucket(limit, window)
+            bucket = by_window.get(bucket.window, bucket)
+            bucket.limit = limit
+            reconciled[window] = bucket
+
+        if counts is not None:
+            for count, window in parse_limits(counts):
+                if window in reconciled:
+                    reconciled[window].sync(count, now)
+
+        return list(reconciled.values())
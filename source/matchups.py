@@ -0,0 +1,114 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import LANES
+from source.merge import shard_paths
+
+
+class Matchups:
+    # games and wins of every champion against every enemy champion, split
+    # by the lane of the champion, indexed [lane, champion, opponent] by
+    # champion key; the last lane holds picks outside of LANES
+
+    def __init__(self, size=0):
+        self.games = np.zeros((len(LANES) + 1, size, size), dtype=np.int32)
+        self.wins = np.zeros((len(LANES) + 1, size, size), dtype=np.int32)
+
+    def _fit(self, size: int):
+        if size <= self.games.shape[1]:
+            return
+        grown = self.games.shape[1]
+        for name in ["games", "wins"]:
+            array = np.zeros((len(LANES) + 1, size, size), dtype=np.int32)
+            array[:, :grown, :grown] = getattr(self, name)
+            setattr(self, name, array)
+
+    def add(self, lanes, champions, opponents, won):
+        # lanes are positions in LANES (-1 for any other lane), opponents
+        # the five enemy champions of each pick, -1 if missing
+        lanes = np.where(np.asarray(lanes) < 0, len(LANES), lanes)
+        opponents = np.asarray(opponents)
+        faced = opponents >= 0
+        if not faced.any():
+            return
+
+        counts = faced.sum(axis=1)
+        lanes = np.repeat(lanes, counts)
+        champions = np.repeat(champions, counts)
+        won = np.repeat(won, counts)
+        opponents = opponents[faced]
+        self._fit(int(max(champions.max(), opponents.max())) + 1)
+
+        np.add.at(self.games, (lanes, champions, opponents), 1)
+        np.add.at(self.wins, (lanes, champions, opponents), won)
+
+    def merge(self, other: "Matchups") -> "Matchups":
+        # counts of another chunk or shard added to these
+        self._fit(other.games.shape[1])
+        size = other.games.shape[1]
+        self.games[:, :size, :size] += other.games
+        self.wins[:, :size, :size] += other.wins
+        return self
+
+    def save(self, path: str):
+        # only the matchups that were played, the arrays are mostly zeros
+        lanes, champions, opponents = np.nonzero(self.games)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, size=self.games.shape[1], lanes=lanes.astype(np.int8),
+                     champions=champions.astype(np.int16), opponents=opponents.astype(np.int16),
+                     games=self.games[lanes, champions, opponents],
+                     wins=self.wins[lanes, champions, opponents])
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "Matchups":
+        with np.load(path) as data:
+            matchups = cls(int(data["size"]))
+            cells = (data["lanes"], data["champions"], data["opponents"])
+            matchups.games[cells] = data["games"]
+            matchups.wins[cells] = data["wins"]
+        return matchups
+
+    def _counts(self, lane=None):
+        if lane is None:
+            return self.games.sum(axis=0), self.wins.sum(axis=0)
+        return self.games[LANES.index(lane)], self.wins[LANES.index(lane)]
+
+    def winrate(self, champion: int, opponent: int, lane=None) -> float:
+        games, wins = self._counts(lane)
+        if max(champion, opponent) >= games.shape[0] or games[champion, opponent] == 0:
+            return np.nan
+        return wins[champion, opponent] / games[champion, opponent]
+
+    def winrates(self, lane=None, min_games=1) -> pd.DataFrame:
+        # every matchup played at least min_games times, e.g. the counts
+        # the exploded champion_picks table was used for
+        games, wins = self._counts(lane)
+        champions, opponents = np.nonzero(games >= max(min_games, 1))
+
+        return pd.DataFrame({
+            "champion": champions.astype(np.int16),
+            "opponent": opponents.astype(np.int16),
+            "games": games[champions, opponents],
+            "wins": wins[champions, opponents],
+            "winrate": wins[champions, opponents] / games[champions, opponents],
+        })
+
+
+def merge_files(path: str, output_path: str) -> Matchups:
+    # sum the matchups of every chunk in path and its region folders,
+    # pickle or dataset output
+    matchups = Matchups()
+    files = sorted(file for shard in shard_paths(path)
+                   for file in glob.glob(f"{shard}/matchups_*-*.npz") +
+                   glob.glob(f"{shard}/matchups/*.npz"))
+    for file in files:
+        matchups.merge(Matchups.load(file))
+
+    matchups.save(f"{output_path}/matchups.npz")
+    print(f"File saved at {output_path}/matchups.npz, chunks: {len(files)}")
+
+    return matchups
@@ -0,0 +1,81 @@
+import os
+import glob
+
+import pandas as pd
+
+from source.extractor import TABLES, STATS_TABLES, STATS_KEYS, STATS_COLUMNS
+from source.dedup import PLATFORMS
+
+
+# tables with one row per match or participant, anything else repeats on purpose
+DEDUPLICATED = ["match_info", "players_info", "champion_picks",
+                "player_match_stats", *STATS_TABLES]
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    # categories of every chunk are unioned so the columns stay categorical
+    frames = [frame for frame in frames if len(frame) > 0] or frames[:1]
+    categorical = [column for column, dtype in frames[0].dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype)]
+
+    for column in categorical:
+        categories = pd.api.types.union_categoricals(
+            [frame[column] for frame in frames], ignore_order=True).categories
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                  for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def shard_paths(path: str) -> list:
+    # the folder and the region folders written by crawler.crawl_regions
+    return [path] + [f"{path}/{region}" for region in sorted(os.listdir(path))
+                     if region.upper() in PLATFORMS and os.path.isdir(f"{path}/{region}")]
+
+
+def merge_files(path: str, output_path: str) -> dict:
+    # join the chunk pickles of every table into one file per table,
+    # region folders included
+
+    merged = {}
+    for table in TABLES:
+        files = sorted(file for shard in shard_paths(path)
+                       for file in glob.glob(f"{shard}/{table}_*-*.pkl"))
+        if len(files) == 0:
+            continue
+
+        frame = concat_frames([pd.read_pickle(file) for file in files])
+
+        # the same match downloaded by two runs
+        if table in DEDUPLICATED:
+            frame = frame.drop_duplicates()
+
+        frame.to_pickle(f"{output_path}/{table}.pkl", protocol=4)
+        merged[table] = frame
+        print(f"File saved at {output_path}/{table}.pkl, rows: {len(frame)}")
+
+    return merged
+
+
+def merge_stats(merged: dict, output_path: str) -> pd.DataFrame:
+    # the four stats tables side by side, taken straight from the wide
+    # table or, for chunks extracted before it existed, joined on the
+    # integer keys when the chunks were extracted with dimensions
+    shared = [*STATS_KEYS, "won"]
+
+    if "player_match_stats" in merged:
+        complete_df = merged["player_match_stats"].sort_values(
+            ["account_id", "lane"], kind="stable", ignore_index=True)
+        complete_df = complete_df[[*shared, *STATS_COLUMNS]]
+    else:
+        tables = list(STATS_TABLES)
+        complete_df = merged[tables[0]]
+        for table in tables[1:]:
+            complete_df = complete_df.merge(merged[table], on=shared, how="left")
+        complete_df = complete_df.fillna(
+            {column: 0 for column in complete_df.columns if column not in shared})
+
+    complete_df.to_pickle(f"{output_path}/merged_stats.pkl", protocol=4)
+    print(f"File saved at {output_path}/merged_stats.pkl")
+
+    return complete_df
@@ -0,0 +1,169 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import LANES, patch_key
+from source.merge import shard_paths
+
+
+class MetaCube:
+    # picks and wins per [patch, region, lane, champion], bans per
+    # [patch, region, champion] and games per [patch, region];
+    # the last lane holds picks outside of LANES
+
+    def __init__(self, size=0):
+        self.patches = []
+        self.regions = []
+        self.size = size
+        self.picks = np.zeros((0, 0, len(LANES) + 1, size), dtype=np.int32)
+        self.wins = np.zeros((0, 0, len(LANES) + 1, size), dtype=np.int32)
+        self.bans = np.zeros((0, 0, size), dtype=np.int32)
+        self.games = np.zeros((0, 0), dtype=np.int32)
+
+    def _fit(self, patches: list, regions: list, size: int):
+        # grow the cube for new patches, regions and champion keys
+        new_patches = [x for x in patches if x not in self.patches]
+        new_regions = [x for x in regions if x not in self.regions]
+        if len(new_patches) == 0 and len(new_regions) == 0 and size <= self.size:
+            return
+
+        self.patches += new_patches
+        self.regions += new_regions
+        self.size = max(size, self.size)
+        p, r = len(self.patches), len(self.regions)
+
+        for name, cube_shape in [("picks", (p, r, len(LANES) + 1, self.size)),
+                                 ("wins", (p, r, len(LANES) + 1, self.size)),
+                                 ("bans", (p, r, self.size)),
+                                 ("games", (p, r))]:
+            old = getattr(self, name)
+            array = np.zeros(cube_shape, dtype=np.int32)
+            array[tuple(slice(0, x) for x in old.shape)] = old
+            setattr(self, name, array)
+
+    def _positions(self, values, known: list) -> np.ndarray:
+        # position in the cube of each patch or region value
+        values = pd.Categorical(values)
+        lookup = np.array([known.index(x) for x in values.categories] + [-1], dtype=np.int64)
+        return lookup[values.codes]
+
+    def add_games(self, patches, regions):
+        patches, regions = pd.Categorical(patches), pd.Categorical(regions)
+        self._fit(list(patches.categories), list(regions.categories), self.size)
+        np.add.at(self.games, (self._positions(patches, self.patches),
+                               self._positions(regions, self.regions)), 1)
+
+    def add_picks(self, patches, regions, lanes, champions, won):
+        # lanes are positions in LANES, -1 for any other lane
+        patches, regions = pd.Categorical(patches), pd.Categorical(regions)
+        champions = np.asarray(champions, dtype=np.int64)
+        size = int(champions.max()) + 1 if len(champions) > 0 else 0
+        self._fit(list(patches.categories), list(regions.categories), size)
+
+        lanes = np.where(np.asarray(lanes) < 0, len(LANES), lanes)
+        cells = (self._positions(patches, self.patches),
+                 self._positions(regions, self.regions), lanes, champions)
+        np.add.at(self.picks, cells, 1)
+        np.add.at(self.wins, cells, np.asarray(won, dtype=np.int32))
+
+    def add_bans(self, patches, regions, champions):
+        # a team with no ban sends -1, it isn't a champion
+        champions = np.asarray(champions, dtype=np.int64)
+        banned = champions >= 0
+        patches = pd.Categorical(np.asarray(patches)[banned])
+        regions = pd.Categorical(np.asarray(regions)[banned])
+        champions = champions[banned]
+        size = int(champions.max()) + 1 if len(champions) > 0 else 0
+        self._fit(list(patches.categories), list(regions.categories), size)
+
+        np.add.at(self.bans, (self._positions(patches, self.patches),
+                              self._positions(regions, self.regions), champions), 1)
+
+    def merge(self, other: "MetaCube") -> "MetaCube":
+        # counts of another chunk or shard added to these
+        self._fit(other.patches, other.regions, other.size)
+        p = [self.patches.index(x) for x in other.patches]
+        r = [self.regions.index(x) for x in other.regions]
+        cells = np.ix_(p, r)
+        size = other.size
+
+        self.picks[cells[0], cells[1], :, :size] += other.picks
+        self.wins[cells[0], cells[1], :, :size] += other.wins
+        self.bans[cells[0], cells[1], :size] += other.bans
+        self.games[cells] += other.games
+        return self
+
+    def save(self, path: str):
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, patches=np.array(self.patches, dtype=str),
+                     regions=np.array(self.regions, dtype=str), picks=self.picks,
+                     wins=self.wins, bans=self.bans, games=self.games)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "MetaCube":
+        cube = cls()
+        with np.load(path) as data:
+            cube.patches = data["patches"].tolist()
+            cube.regions = data["regions"].tolist()
+            cube.picks = data["picks"]
+            cube.wins = data["wins"]
+            cube.bans = data["bans"]
+            cube.games = data["games"]
+        cube.size = cube.bans.shape[2]
+        return cube
+
+    def _select(self, values, known: list):
+        # positions of one value, a list of them, or every one for None
+        if values is None:
+            return list(range(len(known)))
+        if isinstance(values, str):
+            values = [values]
+        return [known.index(x) for x in values if x in known]
+
+    def rates(self, patch=None, region=None, lane=None, min_patch=None) -> pd.DataFrame:
+        # pick, ban and win rates of every champion on a slice of the cube,
+        # e.g. rates(patch="10.14", region="EUW1") or rates(lane="TOP", min_patch="10.12")
+        patches = self._select(patch, self.patches)
+        if min_patch is not None:
+            patches = [i for i in patches
+                       if patch_key(self.patches[i]) >= patch_key(min_patch)]
+        regions = self._select(region, self.regions)
+        lanes = list(range(len(LANES) + 1)) if lane is None else [LANES.index(lane)]
+        cells = np.ix_(patches, regions)
+
+        games = int(self.games[cells].sum())
+        picks = self.picks[cells][:, :, lanes].sum(axis=(0, 1, 2))
+        wins = self.wins[cells][:, :, lanes].sum(axis=(0, 1, 2))
+        bans = self.bans[cells].sum(axis=(0, 1))
+        champions = np.flatnonzero((picks > 0) | (bans > 0))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.DataFrame({
+                "champion": champions.astype(np.int16),
+                "games": games,
+                "picks": picks[champions],
+                "bans": bans[champions],
+                "wins": wins[champions],
+                "pick_rate": picks[champions] / games,
+                "ban_rate": bans[champions] / games,
+                "win_rate": wins[champions] / picks[champions],
+            })
+
+
+def merge_files(path: str, output_path: str) -> MetaCube:
+    # sum the cubes of every chunk in path and its region folders,
+    # pickle or dataset output
+    cube = MetaCube()
+    files = sorted(file for shard in shard_paths(path)
+                   for file in glob.glob(f"{shard}/meta_*-*.npz") +
+                   glob.glob(f"{shard}/meta/*.npz"))
+    for file in files:
+        cube.merge(MetaCube.load(file))
+
+    cube.save(f"{output_path}/meta.npz")
+    print(f"File saved at {output_path}/meta.npz, chunks: {len(files)}")
+
+    return cube
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+
+from contextlib import contextmanager
+
+from source.settings import PROFILE
+
+
+# upper bounds in seconds of the request latency histogram
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+def peak_rss() -> int:
+    # bytes, linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Metrics:
+    # request counts, latencies and throttling per endpoint, items and time
+    # per pipeline stage, shared by every thread of the process
+
+    def __init__(self, profile=PROFILE):
+        self.lock = threading.Lock()
+        self.profile = profile
+        self._profiling = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = {}
+            self.latency = {}
+            self.throttled = {}
+            self.stages = {}
+            self.gauges = {}
+            self.profiles = {}
+
+    def request(self, endpoint: str, status, seconds: float):
+        # status is the http code or "error" when no response came back
+        with self.lock:
+            key = (endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            if endpoint not in self.latency:
+                self.latency[endpoint] = {
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+            histogram = self.latency[endpoint]
+            bucket = len(LATENCY_BUCKETS)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    bucket = i
+                    break
+            histogram["buckets"][bucket] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def throttle(self, endpoint: str, seconds: float):
+        # time spent waiting for the rate limiter
+        if seconds <= 0:
+            return
+        with self.lock:
+            self.throttled[endpoint] = self.throttled.get(endpoint, 0) + seconds
+
+    def _stage(self, name: str, now: float) -> dict:
+        if name not in self.stages:
+            self.stages[name] = {"items": 0, "busy": 0.0, "cpu": 0.0,
+                                 "first": now, "last": now, "peak_rss": 0}
+        return self.stages[name]
+
+    def count(self, name: str, items=1):
+        # items that went through a stage, the rate is taken over the
+        # time between the first and the last item of the stage
+        now = time.time()
+        with self.lock:
+            stage = self._stage(name, now)
+            stage["items"] += items
+            stage["last"] = now
+
+    def rate(self, name: str) -> float:
+        # items per second of a stage so far
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None or stage["last"] <= stage["first"]:
+                return 0.0
+            return stage["items"] / (stage["last"] - stage["first"])
+
+    def gauge(self, name: str, value: float):
+        with self.lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def section(self, name: str, items=0):
+        # wall and cpu time of the calling thread spent in a stage,
+        # profiled with cProfile when profiling is on
+        profiler = self._profiler()
+        began = time.time()
+        began_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            busy = time.time() - began
+            cpu = time.thread_time() - began_cpu
+            if profiler is not None:
+                profiler.disable()
+                self._keep_profile(name, profiler)
+
+            now = time.time()
+            rss = peak_rss()
+            with self.lock:
+                stage = self._stage(name, began)
+                stage["items"] += items
+                stage["busy"] += busy
+                stage["cpu"] += cpu
+                stage["first"] = min(stage["first"], began)
+                stage["last"] = max(stage["last"], now)
+                stage["peak_rss"] = max(stage["peak_rss"], rss)
+
+    def _profiler(self):
+        # a single profiler may run at a time, sections of other threads
+        # and nested ones are timed but not profiled
+        if not self.profile or not self._profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._profiling.release()
+            return None
+        return profiler
+
+    def _keep_profile(self, name: str, profiler: cProfile.Profile):
+        self._profiling.release()
+        with self.lock:
+            if name in self.profiles:
+                self.profiles[name].add(profiler)
+            else:
+                self.profiles[name] = pstats.Stats(profiler)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                elapsed = stage["last"] - stage["first"]
+                stages[name] = {
+                    "items": stage["items"],
+                    "busy_seconds": stage["busy"],
+                    "cpu_seconds": stage["cpu"],
+                    "elapsed_seconds": elapsed,
+                    "items_per_second": stage["items"] / elapsed if elapsed > 0 else 0.0,
+                    "peak_rss_bytes": stage["peak_rss"],
+                }
+
+            requests = {}
+            for (endpoint, status), count in self.requests.items():
+                requests.setdefault(endpoint, {})[status] = count
+
+            return {
+                "started": self.started,
+                "uptime_seconds": time.time() - self.started,
+                "peak_rss_bytes": peak_rss(),
+                "requests": requests,
+                "latency": {endpoint: {"le": LATENCY_BUCKETS + ["+Inf"], **histogram,
+                                       "buckets": list(histogram["buckets"])}
+                            for endpoint, histogram in self.latency.items()},
+                "throttled_seconds": dict(self.throttled),
+                "stages": stages,
+                "gauges": dict(self.gauges),
+            }
+
+    def prometheus(self) -> str:
+        # the snapshot in the prometheus text format, for the node
+        # exporter textfile collector
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE scout_requests_total counter",
+            *[f'scout_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+              for endpoint, statuses in snapshot["requests"].items()
+              for status, count in statuses.items()],
+            "# TYPE scout_request_seconds histogram",
+        ]
+        for endpoint, histogram in snapshot["latency"].items():
+            total = 0
+            for bound, count in zip(histogram["le"], histogram["buckets"]):
+                total += count
+                lines.append(
+                    f'scout_request_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {total}')
+            lines.append(
+                f'scout_request_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum"]}')
+            lines.append(
+                f'scout_request_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+
+        lines.append("# TYPE scout_throttled_seconds_total counter")
+        lines.extend(f'scout_throttled_seconds_total{{endpoint="{endpoint}"}} {seconds}'
+                     for endpoint, seconds in snapshot["throttled_seconds"].items())
+
+        for field, kind in [("items", "counter"), ("busy_seconds", "counter"),
+                            ("cpu_seconds", "counter"), ("items_per_second", "gauge"),
+                            ("peak_rss_bytes", "gauge")]:
+            lines.append(f"# TYPE scout_stage_{field} {kind}")
+            lines.extend(f'scout_stage_{field}{{stage="{name}"}} {stage[field]}'
+                         for name, stage in snapshot["stages"].items())
+
+        lines.append("# TYPE scout_peak_rss_bytes gauge")
+        lines.append(f"scout_peak_rss_bytes {snapshot['peak_rss_bytes']}")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE scout_{name} gauge")
+            lines.append(f"scout_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        # metrics.json, metrics.prom and a .prof file per profiled stage,
+        # written then renamed so a scraper never reads half a file
+        os.makedirs(path, exist_ok=True)
+
+        with open(f"{path}/metrics.json.tmp", "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(f"{path}/metrics.json.tmp", f"{path}/metrics.json")
+
+        with open(f"{path}/metrics.prom.tmp", "w") as f:
+            f.write(self.prometheus())
+        os.replace(f"{path}/metrics.prom.tmp", f"{path}/metrics.prom")
+
+        with self.lock:
+            profiles = dict(self.profiles)
+        for name, stats in profiles.items():
+            stats.dump_stats(f"{path}/{name}.prof")
+
+        print(f"Metrics saved at {path}")
+
+
+# the registry of the process, e.g.
+# with metrics.section("extract"): ...
+metrics = Metrics()
@@ -1,73 +1,58 @@
-import time
-
 from itertools import chain
 
-import requests as req
 import pandas as pd
-import numpy as np
+
+import source.client as client
+import source.ingest as ingest
+from source.metrics import metrics
+from source.settings import REGION
+from source.dedup import game_keys
 
 
-def get_entries(path: str, token: str, master_leagues=True, student_leagues=True, queue="RANKED_SOLO_5x5", tiers={"DIAMOND": "I"}):
-    # TODO check for cases where only one league is specified.
-    n_requests = 0
+def iter_entries(token: str, master_leagues=True, student_leagues=True, queue="RANKED_SOLO_5x5", tiers={"DIAMOND": "I"}, region=REGION):
+    # yields every ladder entry as soon as its page arrives
+
     # getting the entries on master leagues
     if master_leagues:
-        master_players = []
         leagues = [
             "challengerleagues",
             "grandmasterleagues",
             "masterleagues"
         ]
-        base_url = "https://euw1.api.riotgames.com/lol/league/v4"
+        base_url = client.api_url(region, "/lol/league/v4")
 
         for league in leagues:
-            # control the number of requests
-            if n_requests >= 100:
-                print(f"Number of Entries so far: {len(student_players)}")
-                n_requests = 0
-                time.sleep(121)
-
             url = f"{base_url}/{league}/by-queue/{queue}?api_key={token}"
-            res = req.get(url)
-            n_requests += 1
+            res = client.get(url)
             if res.status_code == 200:
-                master_players.append(res.json())
+                league_data = ingest.loads(res.content)
+
+                # attaching the tier to each entry
+                metrics.count("entries", len(league_data["entries"]))
+                for entry in league_data["entries"]:
+                    entry["tier"] = league_data["tier"]
+                    yield entry
             else:
                 print(
                     f"Something went wrong at master leagues: {res.status_code}")
                 break
 
-         # attaching the tier to each entry
-        for x in master_players:
-            for y in x["entries"]:
-                y["tier"] = x["tier"]
-
-        # flatten all leagues into one list because we already specified the league on each entry
-        master_players = list(chain.from_iterable(
-            [x["entries"] for x in master_players]))
-
     # getting entries on student leagues
     if student_leagues:
-        base_url = "https://euw1.api.riotgames.com/lol/league/v4/entries"
-        student_players = []
+        base_url = client.api_url(region, "/lol/league/v4/entries")
         for tier in tiers:
             for division in tiers[tier]:
                 pages = 0
                 while True:
-                    # control the number of requests
-                    if n_requests >= 100:
-                        print(
-                            f"Number of Entries so far: {len(student_players)}")
-                        n_requests = 0
-                        time.sleep(121)
                     pages += 1
                     url = f"{base_url}/{queue}/{tier}/{division}?page={pages}&api_key={token}"
-                    res = req.get(url)
-                    n_requests += 1
+                    res = client.get(url)
 
                     if res.status_code == 200:
-                        if len(res.json()) > 0:
-                            student_players.append(res.json())
+                        page = ingest.loads(res.content)
+                        if len(page) > 0:
+                            metrics.count("entries", len(page))
+                            yield from page
                         else:
                             break
                     else:
@@ -75,73 +60,85 @@ def get_entries(path: str, token: str, master_leagues=True, student_leagues=True
                             f"Something went wrong at student leagues: {res.status_code}")
                         break
 
-        # flatten student leagues players list
-        student_players = list(chain.from_iterable(student_players))
 
-        # turn to data frame and drop columns
-        student_players = pd.DataFrame(student_players).drop(
-            columns=["leagueId", "miniSeries", "queueType"])
+def entries_to_frame(entries: list) -> pd.DataFrame:
+    # turn to data frame, drop useless columns and duplicates
+    players_df = pd.DataFrame(entries)
+    players_df = players_df.drop(
+        columns=["leagueId", "miniSeries", "queueType",
+                 "veteran", "inactive", "freshBlood", "hotStreak"],
+        errors="ignore")
+    players_df = players_df.drop_duplicates().reset_index(drop=True)
 
-        # concatenate both leagues, drop duplicates, drop useless columns
-        players_df = pd.concat([student_players, pd.DataFrame(master_players)])
-        players_df = players_df.reset_index().drop(columns="index")
-        players_df = players_df.drop_duplicates()
-        players_df = players_df.drop(
-            columns=["veteran", "inactive", "freshBlood", "hotStreak"])
+    return players_df
 
-        # export to pickle
-        players_df.to_pickle(f"{path}/players_pool.pkl", protocol=4)
+
+def get_entries(path: str, token: str, master_leagues=True, student_leagues=True, queue="RANKED_SOLO_5x5", tiers={"DIAMOND": "I"}, region=REGION):
+
+    entries = list(iter_entries(token, master_leagues,
+                                student_leagues, queue, tiers, region))
+    print(f"Number of Entries: {len(entries)}")
+
+    # export to pickle
+    players_df = entries_to_frame(entries)
+    players_df.to_pickle(f"{path}/players_pool.pkl", protocol=4)
 
     return print(f"File saved at {path}/players_pool.pkl")
 
 
-def get_account_info(id_list: list, token: str, path: str, start=0, end=0) -> pd.DataFrame:
-    container = []
-    base_url = "https://euw1.api.riotgames.com/lol/summoner/v4/summoners"
-    n_requests = 0
+def fetch_account(summoner_id: str, token: str, region=REGION) -> dict:
+    with metrics.section("fetch_account", items=1):
+        return _fetch_account(summoner_id, token, region)
 
-    # request account info for each summoner_id
-    for i in range(start, end):
 
-        while True:
-            # control the number of requests
-            if n_requests >= 100:
-                print(f"Number of Entries so far: {len(container)}")
-                n_requests = 0
-                time.sleep(121)
+def _fetch_account(summoner_id: str, token: str, region: str) -> dict:
+    base_url = client.api_url(region, "/lol/summoner/v4/summoners")
 
-            # make request
-            url = f"{base_url}/{id_list[i]}?api_key={token}"
-            res = req.get(url)
+    res = client.get(f"{base_url}/{summoner_id}?api_key={token}")
+    if res.status_code == 200:
+        return ingest.loads(res.content)
 
-            # update the number of requests
-            n_requests += 1
+    print(f"Skipping {summoner_id}, {client.error_message(res)}")
+    return None
 
-            # check for errors
-            if res.status_code == 200:
-                container.append(res.json())
-                break
 
-            # handle error
-            else:
-                print(
-                    f"Skipping {i}, {res.json()['status']['message']}")
-                break
+def get_account_info(id_list: list, token: str, path: str, start=0, end=0, journal=None, region=REGION) -> pd.DataFrame:
+    container = []
 
-        # make a partial backup
-        if i != 0 and i % 100 == 0:
-            fragment = pd.DataFrame(container).rename(
-                columns={"id": "summonerId"})
-            fragment = fragment[["summonerId", "accountId"]]
+    # ids finished by a previous run are not requested again
+    completed = journal.completed() if journal is not None else set()
+    if len(completed) > 0:
+        print(f"Number of Entries already in the journal: {len(completed)}")
+
+    # request account info for each summoner_id
+    for i in range(start, end):
+        if id_list[i] in completed:
+            continue
+
+        account = fetch_account(id_list[i], token, region)
+        if account is not None:
+            account = {"summonerId": account["id"],
+                       "accountId": account["accountId"]}
+            container.append(account)
+            if journal is not None:
+                journal.record(id_list[i], account)
+
+        # make a partial backup, the journal already keeps every result
+        if journal is None and i != 0 and i % 100 == 0:
+            print(f"Number of Entries so far: {len(container)}")
+            fragment = pd.DataFrame(
+                container, columns=["summonerId", "accountId"])
             fragment.to_pickle(
                 f"{path}/fragmented_data/account_info_{start}-{i}.pkl", protocol=4)
             print(
                 f"Partial File saved at {path}/fragmented_data/account_info_{start}-{i}.pkl")
+
+    if journal is not None:
+        container = journal.results(id_list[start:end])
     print(f"Done, number of elements: {len(container)}")
 
     # return useful data
-    container = pd.DataFrame(container).rename(columns={"id": "summonerId"})
-    container = container[["summonerId", "accountId"]]
+    container = pd.DataFrame(container, columns=["summonerId", "accountId"])
     container.to_pickle(f"{path}/account_info.pkl", protocol=4)
     print(f"File saved at {path}/account_info.pkl")
 
@@ -152,68 +149,150 @@ def merge_with(players_pool: pd.DataFrame, container: pd.DataFrame, path: str):
     print(f"File saved at {path}/players_pool_account.pkl")
 
 
-def get_match_history(players_list: list, token: str, path: str, start=0, end=0, begin_time=1593475200000, queue_id=420):
+def fetch_match_list(account_id: str, token: str, begin_time=1593475200000, queue_id=420, cache=None, max_age=86400, strict=False, region=REGION) -> list:
+    # with strict a failed page returns None instead of the pages fetched so far
+    with metrics.section("fetch_match_list", items=1):
+        return _fetch_match_list(account_id, token, begin_time, queue_id, cache, max_age, strict, region)
 
-    container = []
-    base_url = f"https://euw1.api.riotgames.com/lol/match/v4/matchlists/by-account"
-    n_requests = 0
-
-    for i in range(start, end):
 
-        # reset begin index
-        begin_index = 0
+def _fetch_match_list(account_id: str, token: str, begin_time: int, queue_id: int, cache, max_age: int, strict: bool, region: str) -> list:
+    base_url = client.api_url(region, "/lol/match/v4/matchlists/by-account")
+    matches = []
 
-        # append a new list for each player
-        # to keep count of number of entries.
-        container.append([])
+    # reset begin index
+    begin_index = 0
 
-        while True:
-            url = f"{base_url}/{players_list[i]}?queue={queue_id}&api_key={token}&beginTime={begin_time}&beginIndex={begin_index}"
+    while True:
+        url = f"{base_url}/{account_id}?queue={queue_id}&api_key={token}&beginTime={begin_time}&beginIndex={begin_index}"
+        key = f"matchlist/{region.lower()}/{account_id}/{queue_id}/{begin_time}/{begin_index}"
 
-            # control the number of requests
-            if n_requests >= 100:
-                print(f"Number of Entries so far: {len(container)}")
-                n_requests = 0
-                time.sleep(121)
+        # matchlists grow over time, cached pages are only good for max_age seconds
+        page = cache.get_raw(key, max_age) if cache is not None else None
+        if page is not None:
+            page = ingest.decode_match_list(page)
 
+        if page is None:
             # make request
-            res = req.get(url)
-            # update number of requests
-            n_requests += 1
-
-            # check for errors
-            if res.status_code == 200:
+            res = client.get(url)
 
-                # check if response is not empty
-                if len(res.json()["matches"]) > 0:
-                    container[len(container) - 1].append(res.json()["matches"])
-
-                    # adjust begin index
-                    begin_index += 100
-                else:
-                    break
+            # riot answers 404 when there are no more games
+            if res.status_code == 404:
+                break
 
             # handle error
-            else:
+            if res.status_code != 200:
                 print(
-                    f"Skipping {i} at page {round(begin_index/100)}, {res.json()['status']['message']}")
+                    f"Skipping {account_id} at page {round(begin_index/100)}, {client.error_message(res)}")
+                if strict:
+                    return None
                 break
 
-        # make a partial backup
-        if i != 0 and i % 100 == 0:
-            fragment = list(chain.from_iterable(
-                list(chain.from_iterable(container))))
-            fragment = pd.DataFrame(fragment)[["gameId", "timestamp"]]
+            if cache is not None:
+                cache.put(key, res.content)
+            page = ingest.decode_match_list(res.content)
+
+        # check if response is not empty
+        if len(page["matches"]) > 0:
+            matches.extend(page["matches"])
+
+            # adjust begin index
+            begin_index += 100
+        else:
+            break
+
+    return matches
+
+
+def get_match_history(players_list: list, token: str, path: str, start=0, end=0, begin_time=1593475200000, queue_id=420, cache=None, journal=None, index=None, region=REGION):
+
+    container = []
+
+    # accounts finished by a previous run are not requested again
+    completed = journal.completed() if journal is not None else set()
+    if len(completed) > 0:
+        print(f"Number of Entries already in the journal: {len(completed)}")
+
+    for i in range(start, end):
+        if players_list[i] in completed:
+            continue
+
+        # with a journal a failed account is left out of it and retried on
+        # restart, without one the pages fetched before the failure are kept
+        listed = fetch_match_list(players_list[i], token, begin_time, queue_id,
+                                  cache, strict=journal is not None, region=region)
+        if listed is None:
+            continue
+
+        # append a new list for each player
+        # to keep count of number of entries.
+        matches = [[match["gameId"], match["timestamp"]] for match in listed]
+        container.append(matches)
+        if journal is not None:
+            journal.record(players_list[i], matches)
+        if index is not None:
+            index.add(game_keys(region, [match[0] for match in matches]))
+
+        if index is not None and i != 0 and i % 100 == 0:
+            index.save()
+
+        # make a partial backup, the journal already keeps every result
+        if journal is None and i != 0 and i % 100 == 0:
+            print(f"Number of Entries so far: {len(container)}")
+            fragment = list(chain.from_iterable(container))
+            fragment = pd.DataFrame(fragment, columns=["gameId", "timestamp"])
             fragment.to_pickle(
                 f"{path}/fragmented_data/match_ids_{start}-{i}.pkl", protocol=4)
             print(
                 f"Partial File saved at {path}/fragmented_data/match_ids_{start}-{i}.pkl")
 
+    if journal is not None:
+        container = journal.results(players_list[start:end])
     print(f"Done, number of elements: {len(container)}")
 
-    # process container and save
-    container = list(chain.from_iterable(list(chain.from_iterable(container))))
-    container = pd.DataFrame(container)[["gameId", "timestamp"]]
+    # process container and save, a game shared by several players is listed once
+    container = list(chain.from_iterable(container))
+    container = pd.DataFrame(container, columns=["gameId", "timestamp"])
+    container = container.drop_duplicates(subset="gameId")
+
+    # games downloaded by earlier runs are left out
+    if index is not None:
+        index.save()
+        fetched = index.is_fetched(game_keys(region, container["gameId"]))
+        print(f"Games already downloaded: {fetched.sum()}")
+        container = container.loc[~fetched]
+
     container.to_pickle(f"{path}/match_ids.pkl", protocol=4)
 
     print(f"File saved at {path}/match_ids.pkl")
+
+
+def refresh_match_history(players_list: list, token: str, path: str, state, begin_time=1593475200000, queue_id=420, cache=None, index=None, region=REGION):
+    # only asks for games newer than each account's watermark,
+    # accounts seen for the first time start at begin_time
+
+    for i, account_id in enumerate(players_list):
+        since = state.watermark(account_id, begin_time)
+        matches = fetch_match_list(
+            account_id, token, since, queue_id, cache, strict=True, region=region)
+
+        # a failed account keeps its watermark and is retried next time
+        if matches is not None:
+            state.advance(account_id, matches)
+            if index is not None:
+                index.add(game_keys(
+                    region, [match["gameId"] for match in matches]))
+
+        if i != 0 and i % 100 == 0:
+            print(f"Number of Entries so far: {i}")
+
+    # games not downloaded yet, including those of an interrupted refresh,
+    # they stay pending until the index has them as fetched
+    container = pd.DataFrame(state.pending(), columns=["gameId", "timestamp"])
+    if index is not None:
+        index.save()
+        fetched = index.is_fetched(game_keys(region, container["gameId"]))
+        state.clear_pending(container.loc[fetched, "gameId"].to_list())
+        container = container.loc[~fetched]
+    container.to_pickle(f"{path}/new_match_ids.pkl", protocol=4)
+
+    print(f"File saved at {path}/new_match_ids.pkl, new games: {len(container)}")
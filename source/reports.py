@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import LANES
+from source.metrics import metrics
+
+
+# radar axes in the order of notebook 9
+KEYS = ["Combat", "Objectives", "Laning", "Supporting", "Jungling", "Survivability"]
+
+# names of the stats on the kpi charts
+LABELS = {
+    "xppm_10": "XP per Minute at 10",
+    "cspm_10": "CS per Minute at 10",
+    "goldpm_10": "Gold per Minute at 10",
+    "dmg_takenpm_10": "Damage Taken per Minute at 10",
+    "dmg_total": "Total Damage Dealt",
+    "healing_total": "Total Healing",
+    "units_healed": "Units Healed",
+    "damage_mitigated": "Damage Mitigated",
+    "crowd_control": "Crowd Control",
+    "dmg_taken": "Damage Taken",
+    "first_blood": "First Blood",
+    "first_blood_assist": "First Blood Assist",
+    "killing_sprees": "Killing Sprees",
+    "longest_time_alive": "Longest Time Alive",
+    "double_kills": "Double Kills",
+    "triple_kills": "Triple Kills",
+    "quadra_kills": "Quadra Kills",
+    "penta_kills": "Penta Kills",
+    "dmg_to_objectives": "Damage to Neutral Objectives",
+    "dmg_to_turrets": "Damage to Turrets",
+    "total_cs": "Total CS",
+    "jungle_cs": "Jungle CS",
+    "jungle_invaded": "Enemy Jungle Invasion",
+    "wards_placed": "Wards Placed",
+    "wards_killed": "Wards Killed",
+}
+
+
+def lane_scores(store, lane: str, features=()) -> pd.DataFrame:
+    # category scores and kpis of every player of the lane in one pass,
+    # winners only like notebook 9, ranked by the mean of the categories
+    scores = store.split(lane, 1)
+    scores = scores[["account_id", *KEYS, *[x for x in features if x not in KEYS]]]
+    scores = scores.assign(average=scores[KEYS].mean(axis=1))
+
+    return scores.sort_values("average", ascending=False, ignore_index=True)
+
+
+def player_names(accounts: list, dimensions=None) -> dict:
+    # "name (region)" of every surrogate key known by dimensions, other
+    # accounts (encrypted ids, keys without a name) are shown as they are
+    names = {account: str(account) for account in accounts}
+    keys = [account for account in accounts if isinstance(account, (int, np.integer))]
+    if dimensions is None or len(keys) == 0:
+        return names
+
+    decoded = dimensions.decode(keys)
+    for key, name, region in zip(decoded["key"], decoded["name"], decoded["region"]):
+        if name:
+            names[key] = f"{name} ({region})" if region else name
+    return names
+
+
+def file_name(name: str) -> str:
+    # a player name safe to use as a file name
+    return re.sub(r'[\\/:*?"<>|\s()]+', "_", name).strip("_") or "_"
+
+
+def player_digests(store, lane: str, accounts: list, names: dict) -> list:
+    # digest of the games count and stat sums of each player's own row of
+    # the store and of their name, it only changes when the player has new
+    # games or was renamed
+    code = LANES.index(lane)
+    with store.lock:
+        rows = [store.rows[(account, code, 1)] for account in accounts]
+        counts = store.counts[rows]
+        sums = store.sums[rows]
+
+    return [hashlib.sha1(count.tobytes() + row.tobytes() + names[account].encode()).hexdigest()
+            for account, count, row in zip(accounts, counts, sums)]
+
+
+def report_specs(store, scores: pd.DataFrame, lane: str, features=(), dimensions=None) -> tuple:
+    # what each report shows against the lane average and the top player,
+    # and the lane context all of them are drawn against
+    features = [x for x in features if x in scores.columns]
+    columns = [*KEYS, *features]
+    if len(scores) == 0:
+        return [], None
+
+    values = np.round(scores[columns].to_numpy(dtype=np.float64), 3)
+    average = np.round(values.mean(axis=0), 3)
+    top = values[0]
+    accounts = scores["account_id"].tolist()
+    low, high = store.scaling(lane, 1)
+    context = {
+        "columns": columns,
+        "average": average.tolist(),
+        "top": top.tolist(),
+        "low": low.tolist(),
+        "high": high.tolist(),
+        "scale": store.scale,
+    }
+
+    specs = []
+    names = player_names(accounts, dimensions)
+    digests = player_digests(store, lane, accounts, names)
+    for account, rank, row, digest in zip(accounts, range(1, len(scores) + 1), values, digests):
+        specs.append({
+            "account_id": account,
+            "name": names[account],
+            "file": file_name(names[account]),
+            "lane": lane,
+            "rank": rank,
+            "players": len(scores),
+            "keys": KEYS,
+            "features": features,
+            "player": row.tolist(),
+            "average": average.tolist(),
+            "top": top.tolist(),
+            "top_account_id": accounts[0],
+            "top_name": names[accounts[0]],
+            "digest": digest,
+        })
+
+    return specs, context
+
+
+def context_moved(old: dict, new: dict, tolerance: float) -> bool:
+    # whether the lane average, the top player or the range the scores are
+    # scaled to moved more than tolerance score points since old
+    if old is None or new is None or old["columns"] != new["columns"]:
+        return True
+
+    low, high = np.array(old["low"]), np.array(old["high"])
+    spread = np.where(high > low, high - low, 1) / old["scale"]
+    shifts = [
+        np.subtract(new["average"], old["average"]),
+        np.subtract(new["top"], old["top"]),
+        (np.array(new["low"]) - low) / spread,
+        (np.array(new["high"]) - high) / spread,
+    ]
+    return max(np.abs(shift).max(initial=0) for shift in shifts) > tolerance
+
+
+# the page of a report, the charts are drawn by plotly.js in the browser
+PAGE = """<html>
+<head><meta charset="utf-8"><script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script></head>
+<body>
+{divs}
+<script>
+{scripts}
+</script>
+</body>
+</html>
+"""
+
+
+def _figures(spec: dict) -> list:
+    # the radars and kpi bars of notebook 9 as plotly figure json, the
+    # same figures plotly.graph_objects builds without its validation
+    n_keys = len(spec["keys"])
+    layout = {"width": 1360, "height": 768, "showlegend": True}
+    figures = []
+
+    for name, other in [("Average", spec["average"]), ("Top Player", spec["top"])]:
+        figures.append({
+            "data": [
+                {"type": "scatterpolar", "r": other[:n_keys], "theta": spec["keys"],
+                 "fill": "toself", "name": name, "marker": {"color": "gray"}},
+                {"type": "scatterpolar", "r": spec["player"][:n_keys], "theta": spec["keys"],
+                 "fill": "toself", "name": "Player", "marker": {"color": "red"}},
+            ],
+            "layout": {**layout, "title": {"text": f"{spec['name']} vs {name}"},
+                       "polar": {"radialaxis": {"visible": True, "range": [0, 18.5]}}},
+        })
+
+    if len(spec["features"]) > 0:
+        labels = [LABELS.get(x, x) for x in spec["features"]]
+        figures.append({
+            "data": [
+                {"type": "bar", "name": "Player", "x": labels, "y": spec["player"][n_keys:],
+                 "marker": {"color": "red"}},
+                {"type": "bar", "name": "Top Player", "x": labels, "y": spec["top"][n_keys:],
+                 "marker": {"color": "gray"}},
+            ],
+            "layout": {**layout, "title": {"text": f"{spec['name']} vs Top Player KPIs"},
+                       "yaxis": {"autorange": False, "range": [0, 21]}},
+        })
+
+    return figures
+
+
+def render(spec: dict, path: str):
+    # {path}/{lane}/{name}.html with the charts and the same name .json
+    # with the numbers of the report
+    file = f"{path}/{spec['lane']}/{spec['file']}"
+
+    figures = _figures(spec)
+    page = PAGE.format(
+        divs="\n".join(f'<div id="chart{i}"></div>' for i in range(len(figures))),
+        scripts="\n".join(f'Plotly.newPlot("chart{i}", {json.dumps(figure["data"])}, '
+                          f'{json.dumps(figure["layout"])});' for i, figure in enumerate(figures)))
+    with open(f"{file}.html.tmp", "w") as f:
+        f.write(page)
+    os.replace(f"{file}.html.tmp", f"{file}.html")
+
+    with open(f"{file}.json.tmp", "w") as f:
+        json.dump(spec, f)
+    os.replace(f"{file}.json.tmp", f"{file}.json")
+
+
+def _render_batch(specs: list, path: str) -> int:
+    for spec in specs:
+        render(spec, path)
+    return len(specs)
+
+
+def _manifest(path: str) -> dict:
+    # digest of every report already rendered
+    if os.path.exists(f"{path}/manifest.json"):
+        with open(f"{path}/manifest.json") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(manifest: dict, path: str):
+    with open(f"{path}/manifest.json.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}/manifest.json.tmp", f"{path}/manifest.json")
+
+
+def generate(store, path: str, lanes=LANES, features=None, workers=None, batch_size=50, force=False, tolerance=0.5, dimensions=None) -> int:
+    # reports of every player of the lanes from an AggregateStore, features
+    # are the kpis of each lane e.g. LaneModels.lane_features(), dimensions
+    # names the players of chunks extracted with surrogate keys; a report is
+    # rendered again when the player has new games, or every report of the
+    # lane when its context moved more than tolerance score points since
+    # the lane was last rendered in full. rank and players in the json of a
+    # skipped report are those of its last render, {lane}_scores.pkl has
+    # the current ones
+    manifest = {} if force else _manifest(path)
+    rendered = 0
+
+    with metrics.section("reports"):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for lane in lanes:
+                os.makedirs(f"{path}/{lane}", exist_ok=True)
+                lane_features = (features or {}).get(lane, [])
+                scores = lane_scores(store, lane, lane_features)
+                scores.to_pickle(f"{path}/{lane}_scores.pkl", protocol=4)
+
+                specs, context = report_specs(store, scores, lane, lane_features, dimensions)
+                done = manifest.get(lane, {})
+                moved = context_moved(done.get("context"), context, tolerance)
+                if moved:
+                    done = {"context": context, "players": {}}
+
+                specs = [spec for spec in specs
+                         if done["players"].get(str(spec["account_id"])) != spec["digest"]]
+
+                batches = [specs[i:i + batch_size] for i in range(0, len(specs), batch_size)]
+                rendered += sum(pool.map(_render_batch, batches, [path] * len(batches)))
+
+                manifest[lane] = {
+                    "context": done["context"],
+                    "players": {**done["players"], **{str(spec["account_id"]): spec["digest"]
+                                                      for spec in specs}},
+                }
+                _save_manifest(manifest, path)
+                print(f"Reports of {lane}: {len(specs)} rendered, "
+                      f"{len(scores) - len(specs)} unchanged"
+                      f"{', lane context moved' if moved and len(scores) > 0 else ''}")
+
+    metrics.count("reports", rendered)
+
+    return rendered
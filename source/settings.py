@@ -10,7 +10,20 @@ load_dotenv(dotenv_path)
 
 # Accessing variables.
 TOKEN = os.getenv("TOKEN")
+API_URL = os.getenv("API_URL", "https://{region}.api.riotgames.com")
+REGION = os.getenv("REGION", "euw1")
+REGIONS = os.getenv("REGIONS", REGION).split(",")
 HOST = os.getenv("HOST")
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
 DB = os.getenv("DB")
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+CACHE_PATH = os.getenv("CACHE_PATH", "raw_data/cache")
+INDEX_PATH = os.getenv("INDEX_PATH", "raw_data/games_index.npz")
+DIMENSIONS_PATH = os.getenv("DIMENSIONS_PATH", "raw_data/dimensions.sqlite")
+AGGREGATES_PATH = os.getenv("AGGREGATES_PATH", "raw_data/aggregates.npz")
+MODELS_PATH = os.getenv("MODELS_PATH", "raw_data/models.pkl")
+STATIC_PATH = os.getenv("STATIC_PATH", "raw_data/static")
+STATIC_OFFLINE = os.getenv("STATIC_OFFLINE", "") not in ["", "0"]
+METRICS_PATH = os.getenv("METRICS_PATH", "raw_data/metrics")
+PROFILE = os.getenv("PROFILE", "") not in ["", "0"]
@@ -0,0 +1,133 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from source.aggregates import GENERAL_KEYS, LANES
+
+
+class ScoreIndex:
+    # per lane matrix of account score vectors (category scores followed
+    # by the lane key features) for nearest neighbour and top-k queries
+
+    def __init__(self):
+        self.columns = {}
+        self.accounts = {}
+        self.vectors = {}
+        self.norms = {}
+        self.rows = {}
+
+    @classmethod
+    def build(cls, store, won=1, features=None) -> "ScoreIndex":
+        # store is an AggregateStore, features the key stats of each lane
+        # e.g. the lists saved by notebook 8 in top_features.pkl
+        index = cls()
+        for lane in LANES:
+            split = store.split(lane, won)
+            columns = [*GENERAL_KEYS, *(features or {}).get(lane, [])]
+            index._set(lane, columns, split["account_id"].to_numpy(),
+                       split[columns].to_numpy(dtype=np.float32))
+        return index
+
+    def _set(self, lane: str, columns: list, accounts: np.ndarray, vectors: np.ndarray, norms=None):
+        self.columns[lane] = list(columns)
+        self.accounts[lane] = accounts
+        self.vectors[lane] = vectors
+        self.norms.pop(lane, None)
+        if norms is not None:
+            self.norms[lane] = norms
+        self.rows.pop(lane, None)
+
+    def _norms(self, lane: str) -> np.ndarray:
+        # squared length of every vector, computed on the first query when
+        # they were not saved with the index
+        if lane not in self.norms:
+            vectors = np.asarray(self.vectors[lane])
+            self.norms[lane] = np.einsum("ij,ij->i", vectors, vectors)
+        return self.norms[lane]
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for lane in self.vectors:
+            np.save(f"{path}/{lane}_vectors.npy", self.vectors[lane])
+            np.save(f"{path}/{lane}_norms.npy", self._norms(lane))
+            # fixed width ids so they can be memory mapped too
+            np.save(f"{path}/{lane}_accounts.npy",
+                    np.array(self.accounts[lane].tolist()))
+        with open(f"{path}/columns.json", "w") as f:
+            json.dump(self.columns, f)
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreIndex":
+        # vectors are memory mapped, nothing is read until it's queried
+        index = cls()
+        with open(f"{path}/columns.json") as f:
+            columns = json.load(f)
+        for lane in columns:
+            norms = f"{path}/{lane}_norms.npy"
+            index._set(lane, columns[lane],
+                       np.load(f"{path}/{lane}_accounts.npy", mmap_mode="r"),
+                       np.load(f"{path}/{lane}_vectors.npy", mmap_mode="r"),
+                       np.load(norms, mmap_mode="r") if os.path.exists(norms) else None)
+        return index
+
+    def _row(self, lane: str, account_id) -> int:
+        if lane not in self.rows:
+            self.rows[lane] = {account: i for i, account
+                               in enumerate(self.accounts[lane].tolist())}
+        return self.rows[lane][account_id]
+
+    def vector(self, lane: str, account_id) -> pd.Series:
+        return pd.Series(self.vectors[lane][self._row(lane, account_id)],
+                         index=self.columns[lane])
+
+    def nearest(self, lane: str, account_ids: list, k=10, batch_size=1024) -> pd.DataFrame:
+        # the k players most like each of account_ids, using
+        # |q - x|^2 = |q|^2 + |x|^2 - 2 q.x over the whole lane at once
+        vectors = self.vectors[lane]
+        rows = np.array([self._row(lane, x) for x in account_ids], dtype=np.int64)
+        k = min(k, len(vectors) - 1)
+        if k <= 0 or len(rows) == 0:
+            return pd.DataFrame(columns=["account_id", "neighbour", "distance"])
+
+        norms = self._norms(lane)
+        found = []
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            distances = norms[batch, None] + norms[None, :] \
+                - 2 * np.asarray(vectors[batch]) @ np.asarray(vectors).T
+            # a player is never their own neighbour
+            distances[np.arange(len(batch)), batch] = np.inf
+
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+
+            found.append(pd.DataFrame({
+                "account_id": np.repeat(self.accounts[lane][batch], k),
+                "neighbour": self.accounts[lane][nearest.ravel()],
+                "distance": np.sqrt(np.maximum(nearest_distances.ravel(), 0)),
+            }))
+
+        return pd.concat(found, ignore_index=True)
+
+    def top(self, lane: str, column="average", k=10) -> pd.DataFrame:
+        # best k players of a lane on one column, or on the mean of the
+        # category scores like the "average" of notebook 9
+        vectors = self.vectors[lane]
+        if column == "average":
+            scores = np.asarray(vectors[:, :len(GENERAL_KEYS)]).mean(axis=1)
+        else:
+            scores = np.asarray(vectors[:, self.columns[lane].index(column)])
+        k = min(k, len(scores))
+        if k == 0:
+            return pd.DataFrame(columns=["account_id", column])
+
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        return pd.DataFrame({"account_id": self.accounts[lane][best],
+                             column: scores[best]})
@@ -0,0 +1,102 @@
+import os
+import json
+from functools import lru_cache
+
+import source.client as client
+from source.extractor import patch_key
+from source.settings import STATIC_PATH, STATIC_OFFLINE
+
+
+DDRAGON_URL = "https://ddragon.leagueoflegends.com"
+
+# Data Dragon files are kept in STATIC_PATH as {version}/{file}, a folder
+# filled by hand (e.g. copied from a previous run) works as an offline
+# fixture when STATIC_OFFLINE is set
+
+
+def _read(file: str):
+    with open(file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _download(url: str, file: str):
+    # fetched once, written then renamed so a crash never leaves half a file
+    if STATIC_OFFLINE:
+        raise FileNotFoundError(f"{file} not found and STATIC_OFFLINE is set")
+
+    res = client.get_session().get(url, timeout=30)
+    res.raise_for_status()
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(f"{file}.tmp", "w", encoding="utf-8") as f:
+        f.write(res.text)
+    os.replace(f"{file}.tmp", file)
+    return res.json()
+
+
+def local_versions() -> list:
+    # versions with files on disk, newest first
+    if not os.path.isdir(STATIC_PATH):
+        return []
+    found = [x for x in os.listdir(STATIC_PATH)
+             if os.path.isdir(f"{STATIC_PATH}/{x}")]
+    return sorted(found, key=patch_key, reverse=True)
+
+
+@lru_cache(maxsize=None)
+def versions(refresh=False) -> list:
+    # every Data Dragon version, newest first
+    file = f"{STATIC_PATH}/versions.json"
+    if os.path.exists(file) and not refresh:
+        return _read(file)
+    try:
+        return _download(f"{DDRAGON_URL}/api/versions.json", file)
+    except (OSError, ValueError):
+        if os.path.exists(file):
+            return _read(file)
+        return local_versions()
+
+
+@lru_cache(maxsize=None)
+def version_for(game_version: str) -> str:
+    # the Data Dragon version of a match, e.g. 10.14.330.6592 -> 10.14.1,
+    # the list is downloaded again only for a patch it doesn't know yet
+    patch = patch_key(game_version)[:2]
+
+    for known in [versions(), local_versions()]:
+        for version in known:
+            if patch_key(version)[:2] == patch:
+                return version
+
+    if not STATIC_OFFLINE:
+        versions.cache_clear()
+        for version in versions(refresh=True):
+            if patch_key(version)[:2] == patch:
+                return version
+
+    # closest older version on disk, offline runs never fail on a new patch
+    older = [x for x in local_versions() if patch_key(x)[:2] <= patch]
+    if len(older) == 0:
+        raise LookupError(f"no static data for patch {game_version}")
+    return older[0]
+
+
+@lru_cache(maxsize=None)
+def champions(version=None) -> dict:
+    # champion key -> name of a version, the newest one on disk by default
+    if version is None:
+        local = local_versions()
+        version = local[0] if len(local) > 0 else versions()[0]
+
+    file = f"{STATIC_PATH}/{version}/champion.json"
+    if os.path.exists(file):
+        data = _read(file)
+    else:
+        data = _download(
+            f"{DDRAGON_URL}/cdn/{version}/data/en_US/champion.json", file)
+
+    return {int(x["key"]): x["name"] for x in data["data"].values()}
+
+
+def champion_names(game_version: str) -> dict:
+    # champion names as they were on the patch a match was played
+    return champions(version_for(game_version))
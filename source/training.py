@@ -0,0 +1,364 @@
+import os
+import glob
+import json
+import time
+import pickle
+import importlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from source.extractor import STATS_COLUMNS, LANES, patch_key
+from source.metrics import metrics
+
+
+# the models compared in notebook 7, (module, class) so sklearn is only
+# imported by the processes that train
+MODELS = {
+    "rf_classifier": ("sklearn.ensemble", "RandomForestClassifier"),
+    "linear_ridge": ("sklearn.linear_model", "RidgeClassifier"),
+    "linear_logistic": ("sklearn.linear_model", "LogisticRegression"),
+    "linear_svc": ("sklearn.svm", "LinearSVC"),
+    "linear_stochastic": ("sklearn.linear_model", "SGDClassifier"),
+    "decision_tree": ("sklearn.tree", "DecisionTreeClassifier"),
+    "neural_network": ("sklearn.neural_network", "MLPClassifier"),
+    "support_vc": ("sklearn.svm", "SVC"),
+}
+
+# time windows of notebook 7, by number of patches or days before the newest game
+PERIODS = ["complete", "last_patch", "last_2_patches", "last_3_patches",
+           "last_month", "last_two_weeks", "last_week"]
+PERIOD_PATCHES = {"last_patch": 1, "last_2_patches": 2, "last_3_patches": 3}
+PERIOD_DAYS = {"last_month": 30, "last_two_weeks": 14, "last_week": 7}
+
+
+def _save(file: str, array: np.ndarray):
+    # np.save adds .npy to any other name, so write through a handle
+    with open(f"{file}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{file}.tmp", file)
+
+
+def period_masks(frame: pd.DataFrame) -> dict:
+    # rows of every window, frame has a patch and a date_created column
+    patches = frame["patch"].astype(str).map(patch_key)
+    newest = sorted({key for key in patches if len(key) > 0}, reverse=True)
+    rank = patches.map({key: i for i, key in enumerate(newest)}).fillna(len(newest)).to_numpy()
+
+    days = pd.to_datetime(frame["date_created"].astype(str), errors="coerce").dt.normalize()
+    masks = {"complete": np.ones(len(frame), dtype=bool)}
+    for period in PERIODS[1:]:
+        if period in PERIOD_PATCHES:
+            masks[period] = rank < PERIOD_PATCHES[period]
+        else:
+            since = days.max() - pd.Timedelta(days=PERIOD_DAYS[period])
+            masks[period] = (days > since).to_numpy()
+
+    return masks
+
+
+def build_features(stats: pd.DataFrame, match_info: pd.DataFrame, path: str):
+    # one float32 matrix per lane saved as .npy so every worker memory maps
+    # the same pages, windows are row numbers into it; stats is the
+    # merged_stats table of merge.merge_stats
+    os.makedirs(path, exist_ok=True)
+    games = match_info[["match_id", "patch", "date_created"]].drop_duplicates("match_id")
+    frame = stats.merge(games, on="match_id", how="left")
+    masks = period_masks(frame)
+    lanes = frame["lane"].astype(str).to_numpy()
+
+    for lane in LANES:
+        rows = lanes == lane
+        features = np.ascontiguousarray(
+            frame.loc[rows, STATS_COLUMNS].to_numpy(dtype=np.float32))
+        _save(f"{path}/{lane}_features.npy", features)
+        _save(f"{path}/{lane}_won.npy", frame.loc[rows, "won"].to_numpy(dtype=np.int8))
+        np.savez(f"{path}/{lane}_windows.npz",
+                 **{period: np.flatnonzero(mask[rows]) for period, mask in masks.items()})
+        print(f"Features of {lane} saved at {path}, rows: {len(features)}")
+
+    with open(f"{path}/columns.json", "w") as f:
+        json.dump(STATS_COLUMNS, f)
+
+
+@lru_cache(maxsize=None)
+def _lane(path: str, lane: str) -> tuple:
+    # opened once per worker process
+    with np.load(f"{path}/{lane}_windows.npz") as windows:
+        windows = {period: windows[period] for period in windows.files}
+    return (np.load(f"{path}/{lane}_features.npy", mmap_mode="r"),
+            np.load(f"{path}/{lane}_won.npy", mmap_mode="r"),
+            windows)
+
+
+def _split(n: int, fold: int, folds: int, seed: int) -> tuple:
+    # a single fold is the 90/10 split of notebook 7
+    if folds == 1:
+        from sklearn.model_selection import train_test_split
+        return train_test_split(np.arange(n), train_size=0.9, random_state=seed)
+
+    from sklearn.model_selection import KFold
+    return list(KFold(folds, shuffle=True, random_state=seed).split(np.arange(n)))[fold]
+
+
+def score(path: str, model: str, lane: str, period: str, fold=0, folds=1, seed=12) -> float:
+    # test accuracy of one model on one fold of a lane window
+    from sklearn.preprocessing import StandardScaler
+
+    features, won, windows = _lane(path, lane)
+    rows = windows[period]
+    if len(rows) < max(10, folds) or len(np.unique(won[rows])) < 2:
+        return np.nan
+
+    train, test = _split(len(rows), fold, folds, seed)
+    train, test = np.sort(rows[train]), np.sort(rows[test])
+
+    # scaled on the training rows only
+    scale = StandardScaler().fit(features[train])
+    module, name = MODELS[model]
+    estimator = getattr(importlib.import_module(module), name)()
+    estimator.fit(scale.transform(features[train]), won[train])
+
+    return round(estimator.score(scale.transform(features[test]), won[test]), 3)
+
+
+def _job(job: tuple) -> tuple:
+    began = time.perf_counter()
+    accuracy = score(*job)
+    return job, accuracy, time.perf_counter() - began
+
+
+def grid(models: list, lanes=LANES, periods=PERIODS, folds=1) -> list:
+    return [(model, lane, period, fold, folds) for model in models for lane in lanes
+            for period in periods for fold in range(folds)]
+
+
+def evaluate(path: str, jobs: list, workers=None) -> pd.DataFrame:
+    # every (model, lane, period, fold, folds) job on a pool of processes
+    rows = []
+    with metrics.section("train", items=len(jobs)):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_job, (path, *job)) for job in jobs]
+            for i, future in enumerate(as_completed(futures)):
+                (_, model, lane, period, fold, _), accuracy, seconds = future.result()
+                rows.append([model, lane, period, fold, accuracy, seconds])
+                if (i + 1) % 10 == 0 or i + 1 == len(jobs):
+                    print(f"Done {i + 1}/{len(jobs)} models")
+
+    return pd.DataFrame(rows, columns=["model", "lane", "period", "fold", "accuracy", "seconds"])
+
+
+def model_accuracy(results: pd.DataFrame, period="last_month") -> pd.DataFrame:
+    # mean accuracy of every model over the lanes, like get_model_accuracy
+    results = results.loc[results["period"] == period]
+    lanes = results.groupby(["model", "lane"])["accuracy"].mean()
+    average = lanes.groupby("model").mean().round(2)
+    models = [model for model in MODELS if model in average.index]
+
+    return pd.DataFrame({"model": models, "accuracy_avg": average[models].to_list()})
+
+
+def model_by_period(results: pd.DataFrame, model="rf_classifier") -> pd.DataFrame:
+    # accuracy of one model per window and lane, like get_model_acc_period
+    results = results.loc[results["model"] == model]
+    table = results.pivot_table(index="period", columns="lane", values="accuracy",
+                                aggfunc="mean").round(3)
+    table = table.reindex(index=[period for period in PERIODS if period in table.index],
+                          columns=[lane for lane in LANES if lane in table.columns])
+
+    return table.rename_axis(index="period", columns=None).reset_index()
+
+
+def train_models(merged_path: str, features_path: str, output_path: str, folds=1, workers=None, build=True):
+    # notebook 7 in one go: every model on the last month, then the random
+    # forest on every window, from the files of merge.merge_stats
+    if build:
+        build_features(pd.read_pickle(f"{merged_path}/merged_stats.pkl"),
+                       pd.read_pickle(f"{merged_path}/match_info.pkl"), features_path)
+
+    jobs = grid(list(MODELS), periods=["last_month"], folds=folds)
+    jobs += [job for job in grid(["rf_classifier"], folds=folds) if job not in jobs]
+    results = evaluate(features_path, jobs, workers)
+    results.to_pickle(f"{output_path}/model_scores.pkl", protocol=4)
+
+    for name, table in [("model_accuracy", model_accuracy(results)),
+                        ("model_by_period", model_by_period(results))]:
+        table.to_pickle(f"{output_path}/{name}.pkl", protocol=4)
+        print(f"File saved at {output_path}/{name}.pkl")
+
+    return results
+
+
+class LaneModels:
+    # per lane win predictors kept current one chunk at a time instead of
+    # refitting on every window: a warm started random forest that grows
+    # trees on the new games only, each tree tagged with its patch so the
+    # patch windows are subsets of trees, and a logistic regression fitted
+    # with partial_fit on running scaler statistics
+
+    def __init__(self, path: str, trees_per_update=20, max_trees=400, n_features=9, min_rows=20):
+        self.path = path
+        self.trees_per_update = trees_per_update
+        self.max_trees = max_trees
+        self.n_features = n_features
+        self.min_rows = min_rows
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            self.lanes = state["lanes"]
+            self.chunks = state["chunks"]
+        else:
+            width = len(STATS_COLUMNS)
+            self.lanes = {lane: {
+                "count": 0,
+                "sum": np.zeros(width),
+                "sumsq": np.zeros(width),
+                "forest": None,
+                "patches": [],
+                "linear": None,
+                "scored": 0,
+                "forest_correct": 0,
+                "linear_correct": 0,
+                "features": [],
+            } for lane in LANES}
+            self.chunks = set()
+
+    def _scale(self, state: dict, features: np.ndarray) -> np.ndarray:
+        # standard scaling with the statistics of every game seen so far
+        mean = state["sum"] / state["count"]
+        std = np.sqrt(np.maximum(state["sumsq"] / state["count"] - mean ** 2, 0))
+        return (features - mean) / np.where(std > 0, std, 1)
+
+    def _grow(self, state: dict, features: np.ndarray, won: np.ndarray, patch: str):
+        from sklearn.ensemble import RandomForestClassifier
+
+        forest = state["forest"]
+        if forest is None:
+            forest = state["forest"] = RandomForestClassifier(
+                n_estimators=0, warm_start=True, random_state=np.random.RandomState(12))
+
+        # with warm_start only the new trees are fitted, on the new games
+        forest.n_estimators += self.trees_per_update
+        forest.fit(features, won)
+        state["patches"] += [patch] * self.trees_per_update
+
+        # oldest trees go first, the forest follows the recent patches
+        if len(forest.estimators_) > self.max_trees:
+            forest.estimators_ = forest.estimators_[-self.max_trees:]
+            forest.n_estimators = self.max_trees
+            state["patches"] = state["patches"][-self.max_trees:]
+
+    def _update_lane(self, state: dict, features: np.ndarray, won: np.ndarray, patches: np.ndarray):
+        from sklearn.linear_model import SGDClassifier
+
+        # accuracy on games the models have not seen yet, then train on them
+        if state["forest"] is not None:
+            state["forest_correct"] += int((state["forest"].predict(features) == won).sum())
+            state["linear_correct"] += int(
+                (state["linear"].predict(self._scale(state, features)) == won).sum())
+            state["scored"] += len(won)
+
+        state["count"] += len(features)
+        state["sum"] += features.sum(axis=0, dtype=np.float64)
+        state["sumsq"] += np.square(features, dtype=np.float64).sum(axis=0)
+
+        if state["linear"] is None:
+            state["linear"] = SGDClassifier(loss="log_loss", random_state=12)
+        state["linear"].partial_fit(self._scale(state, features), won, classes=[0, 1])
+
+        for patch in pd.unique(patches):
+            rows = patches == patch
+            if rows.sum() >= self.min_rows and len(np.unique(won[rows])) == 2:
+                self._grow(state, features[rows], won[rows], patch)
+
+        # key features from the importances of the trees, no refit needed
+        if state["forest"] is not None:
+            importances = np.mean([tree.feature_importances_
+                                   for tree in state["forest"].estimators_], axis=0)
+            top = np.argsort(importances)[::-1][:self.n_features]
+            state["features"] = [STATS_COLUMNS[i] for i in top]
+
+    def update(self, player_match_stats: pd.DataFrame, match_info: pd.DataFrame, chunk: str) -> bool:
+        # add a chunk of player_match_stats (or merged_stats) with the
+        # match_info of its games, a chunk already added is skipped
+        with self.lock:
+            if chunk in self.chunks:
+                return False
+
+            games = match_info[["match_id", "patch"]].drop_duplicates("match_id")
+            frame = player_match_stats.merge(games, on="match_id", how="left")
+            lanes = frame["lane"].astype(str).to_numpy()
+            patches = frame["patch"].astype(str).to_numpy()
+
+            with metrics.section("retrain", items=len(frame)):
+                for lane in LANES:
+                    rows = lanes == lane
+                    if rows.sum() == 0:
+                        continue
+                    self._update_lane(
+                        self.lanes[lane],
+                        frame.loc[rows, STATS_COLUMNS].to_numpy(dtype=np.float32),
+                        frame.loc[rows, "won"].to_numpy(dtype=np.int8),
+                        patches[rows])
+
+            self.chunks.add(chunk)
+
+        return True
+
+    def update_from_chunks(self, path: str) -> int:
+        # every chunk of path not added yet, in the order they were saved
+        added = 0
+        files = glob.glob(f"{path}/player_match_stats_*-*.pkl")
+        for file in sorted(files, key=lambda x: int(x.rsplit("_", 1)[1].split("-")[0])):
+            chunk = os.path.abspath(file)
+            info = file.replace("player_match_stats_", "match_info_")
+            if chunk in self.chunks or not os.path.exists(info):
+                continue
+            added += self.update(pd.read_pickle(file), pd.read_pickle(info), chunk)
+
+        print(f"Chunks added to the win predictors: {added}")
+        return added
+
+    def predict(self, lane: str, features: np.ndarray, model="forest", patches=None) -> np.ndarray:
+        # win probability, with patches only the trees of the last n patches vote
+        with self.lock:
+            state = self.lanes[lane]
+            if model == "linear":
+                return state["linear"].predict_proba(self._scale(state, features))[:, 1]
+
+            trees = state["forest"].estimators_
+            if patches is not None:
+                newest = sorted(set(state["patches"]), key=patch_key, reverse=True)[:patches]
+                trees = [tree for tree, patch in zip(trees, state["patches"]) if patch in newest]
+
+        return np.mean([tree.predict_proba(features)[:, 1] for tree in trees], axis=0)
+
+    def accuracy(self) -> pd.DataFrame:
+        # accuracy of each lane on every game before it was trained on
+        rows = []
+        with self.lock:
+            for lane, state in self.lanes.items():
+                scored = max(state["scored"], 1)
+                rows.append([lane, state["count"], round(state["forest_correct"] / scored, 3),
+                             round(state["linear_correct"] / scored, 3)])
+
+        return pd.DataFrame(rows, columns=["lane", "games", "rf_classifier", "linear_stochastic"])
+
+    def lane_features(self) -> pd.DataFrame:
+        # same layout as the lane_features table of notebook 7
+        with self.lock:
+            return pd.DataFrame({lane: [list(state["features"])]
+                                 for lane, state in self.lanes.items()})
+
+    def save(self):
+        with self.lock:
+            with open(f"{self.path}.tmp", "wb") as f:
+                pickle.dump({"lanes": self.lanes, "chunks": self.chunks}, f, protocol=4)
+            os.replace(f"{self.path}.tmp", self.path)